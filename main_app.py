@@ -7,10 +7,18 @@ from io import BytesIO
 import shutil # Import shutil for cleaning up temporary directories
 
 # --- Import các hàm từ thư mục scripts ---
-from scripts.code_generator import load_existing_codes, generate_random_code, get_unique_filename
+from scripts.code_generator import load_existing_codes, generate_random_code, get_unique_filename, write_codes_csv, DEFAULT_CHUNK_SIZE
 from scripts.excel_processor import process_excel_for_codes
 from scripts.file_converter import convert_file
-from scripts.batch_processor import split_file_by_rows, convert_single_file, create_zip_archive
+from scripts.batch_processor import (split_file_by_rows, split_file_by_column, convert_single_file, create_zip_archive,
+                                     DEFAULT_MAX_OPEN_PARTITIONS)
+from scripts.compression import split_compression_suffix, data_extension
+from scripts.row_filter import parse_row_filters, parse_column_selection
+from scripts.memory_planner import plan_execution, streaming_supported_for, IN_MEMORY, STREAMING, REJECT
+from scripts.streaming_io import iter_dataframe_chunks
+from scripts.code_index import lookup_codes, read_codes_to_verify, write_lookup_results
+from scripts.watch_folder import FolderWatcher
+from scripts.job_runner import JobRunner, default_max_workers, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
 
 # --- Cấu hình trang Streamlit ---
 st.set_page_config(
@@ -25,6 +33,42 @@ st.write("Chào mừng bạn đến với công cụ mạnh mẽ để tạo sin
 # --- Thiết lập thư mục đầu ra ---
 OUTPUT_DIR = Path("processed_files_output")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+CODE_INDEX_PATH = OUTPUT_DIR / "code_index.sqlite3"
+# Kết quả tra cứu được lưu riêng, ngoài các file mã được lập chỉ mục / kiểm tra trùng
+LOOKUP_RESULTS_DIR = OUTPUT_DIR / "lookups"
+
+# --- Bộ chạy tác vụ nền (dùng chung cho mọi phiên, sống sót qua các lần rerun) ---
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(OUTPUT_DIR / "jobs", max_workers=default_max_workers())
+
+# Các thư mục theo dõi đang chạy, dùng chung cho mọi phiên (key: đường dẫn thư mục)
+@st.cache_resource
+def get_folder_watchers():
+    return {}
+
+def row_filter_inputs(key):
+    """Hiển thị ô nhập điều kiện lọc hàng / chọn cột. Trả về (row_filters, columns, hợp lệ)."""
+    with st.expander("Lọc hàng & chọn cột (tùy chọn) — chỉ các hàng khớp được đọc và ghi ra"):
+        filter_text = st.text_area(
+            "Điều kiện lọc (mỗi dòng một điều kiện, tất cả phải thỏa):",
+            key=f"row_filters_{key}",
+            help="Ví dụ: `region == North`, `amount >= 100`, `code startswith ABC`, `name contains shop`, "
+                 "`campaign in A1, B2`. Với file TXT (không có tiêu đề), dùng số thứ tự cột bắt đầu từ 0."
+        )
+        columns_text = st.text_input("Chỉ giữ các cột (phân cách bằng dấu phẩy, để trống = tất cả):", key=f"columns_{key}")
+    try:
+        return parse_row_filters(filter_text), parse_column_selection(columns_text), True
+    except ValueError as e:
+        st.error(f"Lỗi: {e}")
+        return None, None, False
+
+def save_upload_to_job(job_runner, job_id, uploaded_file):
+    """Ghi file tải lên vào thư mục input của tác vụ nền và trả về đường dẫn."""
+    input_path = job_runner.job_dir(job_id) / "input" / uploaded_file.name
+    with open(input_path, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+    return input_path
 
 # --- Giao diện người dùng Streamlit ---
 
@@ -40,6 +84,14 @@ if st.sidebar.button("Kiểm tra thư mục"):
     else:
         st.sidebar.error(f"Đường dẫn thư mục không hợp lệ: `{directory_to_check}`. Vui lòng kiểm tra lại.")
 
+output_compression_label = st.sidebar.selectbox(
+    "Nén file đầu ra CSV/TXT:",
+    ("Không nén", "gzip", "zstd"),
+    help="File đầu vào .gz/.zst luôn được tự động giải nén khi đọc. zstd cần cài thư viện 'zstandard'."
+)
+output_compression = None if output_compression_label == "Không nén" else output_compression_label
+COMPRESSED_MIME_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+
 st.sidebar.markdown("---")
 st.sidebar.header("Chọn chức năng")
 function_choice = st.sidebar.radio(
@@ -50,6 +102,10 @@ function_choice = st.sidebar.radio(
         "Đếm Dòng File",
         "Chuyển đổi Định dạng File",
         "Xử lý File Hàng loạt",
+        "Kiểm tra Trùng Mã",
+        "Tra cứu Mã Hàng loạt",
+        "Tác vụ nền",
+        "Thư mục Theo dõi",
         "Thông tin"
     ]
 )
@@ -61,12 +117,25 @@ if function_choice == "Tạo Mã Thủ công":
 
     prefix_manual = st.text_input("Nhập tiền tố (3-8 ký tự, chữ cái và số):").strip().upper()
     num_codes_manual = st.number_input("Số lượng mã cần tạo:", min_value=1, value=100, step=1)
+    run_in_background_manual = st.checkbox("Chạy nền (không bị gián đoạn khi tải lại trang)", key="bg_manual")
+    chunk_size_manual = None
+    if run_in_background_manual and st.checkbox("Ghi theo lô, có thể tiếp tục nếu bị gián đoạn (cho đơn hàng rất lớn)", key="chunked_manual"):
+        chunk_size_manual = st.number_input("Số mã mỗi file lô:", min_value=1000, value=DEFAULT_CHUNK_SIZE, step=100000)
 
     if st.button("Tạo Mã"):
         if not (3 <= len(prefix_manual) <= 8):
             st.error("Lỗi: Tiền tố phải dài từ 3 đến 8 ký tự.")
         elif num_codes_manual <= 0:
             st.error("Lỗi: Số lượng mã phải lớn hơn 0.")
+        elif run_in_background_manual:
+            job_id = get_job_runner().submit("generate", {
+                "prefix": prefix_manual,
+                "num_codes": int(num_codes_manual),
+                "directory_to_check": directory_to_check,
+                "chunk_size": int(chunk_size_manual) if chunk_size_manual else None,
+                "compression": output_compression,
+            })
+            st.success(f"Đã gửi tác vụ nền `{job_id}`. Xem tiến trình tại mục **Tác vụ nền**.")
         else:
             try:
                 st.info(f"Đang tải mã hiện có từ `{directory_to_check}`...")
@@ -83,12 +152,9 @@ if function_choice == "Tạo Mã Thủ công":
                 codes_to_write = generate_random_code(prefix_manual, num_codes_manual, existing_codes_set, update_progress)
 
                 if codes_to_write:
-                    output_file_path = get_unique_filename(prefix_manual, OUTPUT_DIR)
+                    output_file_path = get_unique_filename(prefix_manual, OUTPUT_DIR, output_compression)
                     
-                    with open(output_file_path, mode="w", newline="", encoding="utf-8") as file:
-                        writer = csv.writer(file)
-                        writer.writerow(["code"])
-                        writer.writerows(codes_to_write)
+                    write_codes_csv(output_file_path, codes_to_write)
                     
                     st.success(f"Đã tạo {len(codes_to_write)} mã mới và lưu vào: `{output_file_path.name}` trong thư mục `{OUTPUT_DIR}`.")
                     st.write(f"Ví dụ mã: **{codes_to_write[0][0]}** (Độ dài: {len(codes_to_write[0][0])})")
@@ -96,12 +162,13 @@ if function_choice == "Tạo Mã Thủ công":
                     generated_df = pd.DataFrame(codes_to_write, columns=["code"])
                     st.dataframe(generated_df.head(10))
 
-                    st.download_button(
-                        label=f"Tải xuống {output_file_path.name}",
-                        data=generated_df.to_csv(index=False).encode('utf-8'),
-                        file_name=output_file_path.name,
-                        mime="text/csv"
-                    )
+                    with open(output_file_path, "rb") as f:
+                        st.download_button(
+                            label=f"Tải xuống {output_file_path.name}",
+                            data=f.read(),
+                            file_name=output_file_path.name,
+                            mime=COMPRESSED_MIME_TYPES.get(output_compression, "text/csv")
+                        )
                 else:
                     st.warning("Không thể tạo thêm mã duy nhất nào dựa trên yêu cầu và các mã hiện có.")
             except ValueError as e:
@@ -119,7 +186,24 @@ elif function_choice == "Tạo Mã từ File Excel":
     uploaded_excel_file = st.file_uploader("Tải lên file Excel của bạn", type=["xlsx", "xls"])
 
     if uploaded_excel_file is not None:
-        if st.button("Tạo Mã từ Excel"):
+        run_in_background_excel = st.checkbox("Chạy nền (không bị gián đoạn khi tải lại trang)", key="bg_excel")
+        chunk_size_excel = None
+        if run_in_background_excel and st.checkbox("Ghi theo lô, có thể tiếp tục nếu bị gián đoạn (cho đơn hàng rất lớn)", key="chunked_excel"):
+            chunk_size_excel = st.number_input("Số mã mỗi file lô:", min_value=1000, value=DEFAULT_CHUNK_SIZE, step=100000, key="chunk_size_excel")
+
+        start_excel = st.button("Tạo Mã từ Excel")
+        if start_excel and run_in_background_excel:
+            job_runner = get_job_runner()
+            job_id = job_runner.create_job_dir()
+            input_path = save_upload_to_job(job_runner, job_id, uploaded_excel_file)
+            job_runner.submit("generate_excel", {
+                "input_file": str(input_path),
+                "directory_to_check": directory_to_check,
+                "chunk_size": int(chunk_size_excel) if chunk_size_excel else None,
+                "compression": output_compression,
+            }, job_id=job_id)
+            st.success(f"Đã gửi tác vụ nền `{job_id}`. Xem tiến trình tại mục **Tác vụ nền**.")
+        elif start_excel:
             try:
                 excel_progress_bar = st.progress(0)
                 excel_status_text = st.empty()
@@ -131,7 +215,8 @@ elif function_choice == "Tạo Mã từ File Excel":
                     uploaded_excel_file,
                     directory_to_check,
                     OUTPUT_DIR,
-                    update_excel_progress
+                    update_excel_progress,
+                    compression=output_compression
                 )
                 
                 excel_progress_bar.empty()
@@ -157,26 +242,42 @@ elif function_choice == "Đếm Dòng File":
     st.header("🔢 Đếm Dòng File CSV/Excel")
     st.write("Tải lên một file CSV hoặc Excel để đếm tổng số dòng dữ liệu.")
 
-    uploaded_file_to_count = st.file_uploader("Tải lên file của bạn", type=["csv", "xlsx", "xls"])
+    uploaded_file_to_count = st.file_uploader("Tải lên file của bạn", type=["csv", "xlsx", "xls", "gz", "zst"])
 
     if uploaded_file_to_count is not None:
         if st.button("Đếm Dòng"):
             st.info(f"Đang đếm dòng cho file: {uploaded_file_to_count.name}...")
             try:
-                file_extension = Path(uploaded_file_to_count.name).suffix.lower()
-
-                if file_extension == '.csv':
-                    df = pd.read_csv(uploaded_file_to_count)
-                elif file_extension in ['.xlsx', '.xls']:
-                    df = pd.read_excel(uploaded_file_to_count)
-                else:
+                file_extension = data_extension(uploaded_file_to_count.name)
+                if file_extension not in ['.csv', '.xlsx', '.xls']:
                     st.error("Loại file không được hỗ trợ. Chỉ chấp nhận CSV và Excel.")
                     st.stop()
 
-                num_rows = len(df)
+                count_plan = plan_execution(uploaded_file_to_count.size, uploaded_file_to_count.name,
+                                            streaming_supported_for(uploaded_file_to_count.name, "count"))
+                if count_plan.mode == REJECT:
+                    st.error(count_plan.reason)
+                    st.stop()
+
+                if count_plan.mode == IN_MEMORY:
+                    if file_extension == '.csv':
+                        df = pd.read_csv(uploaded_file_to_count, compression=split_compression_suffix(uploaded_file_to_count.name)[1])
+                    else:
+                        df = pd.read_excel(uploaded_file_to_count)
+                    num_rows = len(df)
+                    preview_df = df.head()
+                else:
+                    st.info(count_plan.reason)
+                    num_rows = 0
+                    preview_df = None
+                    for chunk in iter_dataframe_chunks(uploaded_file_to_count, uploaded_file_to_count.name):
+                        num_rows += len(chunk)
+                        if preview_df is None:
+                            preview_df = chunk.head()
+
                 st.success(f"File '{uploaded_file_to_count.name}' có **{num_rows}** dòng dữ liệu (không bao gồm tiêu đề nếu có).")
                 st.write("5 dòng đầu tiên:")
-                st.dataframe(df.head())
+                st.dataframe(preview_df)
             except Exception as e:
                 st.error(f"Lỗi khi đếm dòng hoặc đọc file '{uploaded_file_to_count.name}': {e}")
     else:
@@ -187,7 +288,7 @@ elif function_choice == "Chuyển đổi Định dạng File":
     st.header("🔄 Chuyển đổi Định dạng File")
     st.write("Chuyển đổi file của bạn giữa các định dạng CSV, Excel (.xlsx) và TXT.")
 
-    uploaded_file_convert = st.file_uploader("Tải lên file cần chuyển đổi (.csv, .xlsx, .xls, .txt)", type=["csv", "xlsx", "xls", "txt"])
+    uploaded_file_convert = st.file_uploader("Tải lên file cần chuyển đổi (.csv, .xlsx, .xls, .txt, có thể nén .gz/.zst)", type=["csv", "xlsx", "xls", "txt", "gz", "zst"])
 
     if uploaded_file_convert is not None:
         st.write("Chọn định dạng đầu ra:")
@@ -197,9 +298,36 @@ elif function_choice == "Chuyển đổi Định dạng File":
             key="target_format_radio"
         )
 
-        if st.button("Chuyển đổi"):
+        convert_row_filters, convert_columns, convert_filters_valid = row_filter_inputs("convert")
+        run_in_background_convert = st.checkbox("Chạy nền (không bị gián đoạn khi tải lại trang)", key="bg_convert")
+
+        convert_plan = plan_execution(uploaded_file_convert.size, uploaded_file_convert.name,
+                                      streaming_supported_for(uploaded_file_convert.name, "convert",
+                                                              bool(convert_row_filters or convert_columns)))
+        if convert_plan.mode == STREAMING:
+            st.info(convert_plan.reason)
+        elif convert_plan.mode == REJECT:
+            st.error(convert_plan.reason)
+
+        start_convert = st.button("Chuyển đổi", disabled=convert_plan.mode == REJECT)
+        if start_convert and not convert_filters_valid:
+            st.warning("Vui lòng sửa điều kiện lọc trước khi chuyển đổi.")
+        elif start_convert and run_in_background_convert:
+            job_runner = get_job_runner()
+            job_id = job_runner.create_job_dir()
+            input_path = save_upload_to_job(job_runner, job_id, uploaded_file_convert)
+            job_runner.submit("convert", {
+                "input_file": str(input_path),
+                "target_format": target_format,
+                "compression": output_compression,
+                "row_filters": convert_row_filters,
+                "columns": convert_columns,
+            }, job_id=job_id)
+            st.success(f"Đã gửi tác vụ nền `{job_id}`. Xem tiến trình tại mục **Tác vụ nền**.")
+        elif start_convert:
             with st.spinner(f"Đang chuyển đổi '{uploaded_file_convert.name}' sang {target_format.upper()}..."):
-                output_path, result_df = convert_file(uploaded_file_convert, target_format, OUTPUT_DIR)
+                output_path, result_df = convert_file(uploaded_file_convert, target_format, OUTPUT_DIR, output_compression,
+                                                      convert_row_filters, convert_columns)
 
                 if output_path and result_df is not None:
                     st.success(f"Đã chuyển đổi thành công! File đã lưu tại: `{output_path.name}` trong thư mục `{OUTPUT_DIR}`.")
@@ -209,7 +337,13 @@ elif function_choice == "Chuyển đổi Định dạng File":
                     # Chuẩn bị dữ liệu cho nút tải xuống dựa trên định dạng đích
                     download_data = None
                     mime_type = ""
-                    if target_format == 'csv':
+                    if (split_compression_suffix(output_path.name)[1] or convert_row_filters or convert_columns
+                            or convert_plan.mode == STREAMING):
+                        # File nén hoặc đã lọc (result_df chỉ là bản xem trước): tải xuống đúng file đã ghi trên đĩa
+                        with open(output_path, "rb") as f:
+                            download_data = f.read()
+                        mime_type = COMPRESSED_MIME_TYPES.get(split_compression_suffix(output_path.name)[1], "application/octet-stream")
+                    elif target_format == 'csv':
                         download_data = result_df.to_csv(index=False, encoding='utf-8').encode('utf-8')
                         mime_type = "text/csv"
                     elif target_format == 'excel':
@@ -247,8 +381,8 @@ elif function_choice == "Xử lý File Hàng loạt":
 
     st.subheader("1. Tải lên File Đầu vào")
     uploaded_files = st.file_uploader(
-        "Chọn các file (.txt, .csv, .xlsx, .xls) bạn muốn xử lý:",
-        type=["txt", "csv", "xlsx", "xls"],
+        "Chọn các file (.txt, .csv, .xlsx, .xls, có thể nén .gz/.zst) bạn muốn xử lý:",
+        type=["txt", "csv", "xlsx", "xls", "gz", "zst"],
         accept_multiple_files=True,
         help="Bạn có thể chọn nhiều file cùng lúc."
     )
@@ -276,17 +410,20 @@ elif function_choice == "Xử lý File Hàng loạt":
         st.session_state.split_configs = {}
 
     if uploaded_files:
-        st.info("Để tách file, hãy chọn file và nhập số dòng/hàng cần giữ cùng hậu tố tùy chỉnh.")
+        st.info("Để tách file, hãy chọn file và nhập số dòng/hàng cần giữ cùng hậu tố tùy chỉnh, hoặc chọn cột để tách mỗi giá trị thành một file.")
         
         for uploaded_file in uploaded_files:
             file_key = f"split_config_{uploaded_file.name}"
             
-            with st.expander(f"Cấu hình tách cho file: **{uploaded_file.name}** ({Path(uploaded_file.name).suffix.upper()})"):
+            with st.expander(f"Cấu hình tách cho file: **{uploaded_file.name}** ({data_extension(uploaded_file.name).upper()})"):
                 if file_key not in st.session_state.split_configs:
                     st.session_state.split_configs[file_key] = {
                         'do_split': False,
+                        'split_by': 'rows',
                         'lines_to_keep': 100,
-                        'suffix': "(1)"
+                        'suffix': "(1)",
+                        'partition_column': "",
+                        'max_open_files': DEFAULT_MAX_OPEN_PARTITIONS
                     }
                 
                 current_config = st.session_state.split_configs[file_key]
@@ -299,6 +436,32 @@ elif function_choice == "Xử lý File Hàng loạt":
                 st.session_state.split_configs[file_key]['do_split'] = do_split
 
                 if do_split:
+                    split_by = st.radio(
+                        "Kiểu tách:",
+                        ('rows', 'column'),
+                        index=0 if current_config.get('split_by', 'rows') == 'rows' else 1,
+                        format_func=lambda mode: "Theo số dòng" if mode == 'rows' else "Theo giá trị cột (mỗi giá trị một file)",
+                        key=f"split_by_{file_key}"
+                    )
+                    st.session_state.split_configs[file_key]['split_by'] = split_by
+
+                if do_split and split_by == 'column':
+                    partition_column = st.text_input(
+                        "Cột dùng để tách (tên cột, hoặc số thứ tự từ 0 với file TXT):",
+                        value=current_config.get('partition_column', ""),
+                        key=f"partition_column_{file_key}"
+                    )
+                    st.session_state.split_configs[file_key]['partition_column'] = partition_column.strip()
+
+                    max_open_files = st.number_input(
+                        "Số file đầu ra mở cùng lúc tối đa:",
+                        min_value=1,
+                        value=current_config.get('max_open_files', DEFAULT_MAX_OPEN_PARTITIONS),
+                        key=f"max_open_{file_key}",
+                        help="File được đọc một lần duy nhất; khi có nhiều giá trị hơn số này, các file ít dùng nhất được đóng và mở lại sau."
+                    )
+                    st.session_state.split_configs[file_key]['max_open_files'] = int(max_open_files)
+                elif do_split:
                     lines_to_keep = st.number_input(
                         f"Số dòng/hàng để giữ trong '{uploaded_file.name}' (phần gốc):",
                         min_value=1,
@@ -319,12 +482,39 @@ elif function_choice == "Xử lý File Hàng loạt":
     else:
         st.info("Vui lòng tải lên file để cấu hình tùy chọn tách.")
 
+    st.markdown("---")
+    batch_row_filters, batch_columns, batch_filters_valid = row_filter_inputs("batch")
+
     st.markdown("---")
     st.subheader("4. Bắt đầu Xử lý")
 
+    run_in_background_batch = st.checkbox("Chạy nền (không bị gián đoạn khi tải lại trang)", key="bg_batch")
+
     if st.button("Bắt đầu Xử lý File Hàng loạt", key="start_batch_process"):
         if not uploaded_files:
             st.warning("Vui lòng tải lên ít nhất một file để bắt đầu xử lý.")
+        elif not batch_filters_valid:
+            st.warning("Vui lòng sửa điều kiện lọc trước khi xử lý.")
+        elif any(config.get('do_split') and config.get('split_by') == 'column' and not config.get('partition_column')
+                 for config in (st.session_state.split_configs.get(f"split_config_{uploaded_file.name}", {})
+                                for uploaded_file in uploaded_files)):
+            st.warning("Vui lòng nhập cột dùng để tách cho các file tách theo giá trị cột.")
+        elif run_in_background_batch:
+            job_runner = get_job_runner()
+            job_id = job_runner.create_job_dir()
+            input_paths = [save_upload_to_job(job_runner, job_id, uploaded_file) for uploaded_file in uploaded_files]
+            job_runner.submit("batch", {
+                "input_files": [str(p) for p in input_paths],
+                "output_format": output_format_select,
+                "compression": output_compression,
+                "row_filters": batch_row_filters,
+                "columns": batch_columns,
+                "split_configs": {
+                    uploaded_file.name: st.session_state.split_configs.get(f"split_config_{uploaded_file.name}", {})
+                    for uploaded_file in uploaded_files
+                },
+            }, job_id=job_id)
+            st.success(f"Đã gửi tác vụ nền `{job_id}`. Xem tiến trình tại mục **Tác vụ nền**.")
         else:
             processed_files_info = []
             total_files = len(uploaded_files)
@@ -348,9 +538,23 @@ elif function_choice == "Xử lý File Hàng loạt":
                 file_key = f"split_config_{uploaded_file.name}"
                 config_for_this_file = st.session_state.split_configs.get(file_key, {})
                 do_split_this_file = config_for_this_file.get('do_split', False)
+                split_by_column_this_file = do_split_this_file and config_for_this_file.get('split_by') == 'column'
                 lines_to_keep_this_file = config_for_this_file.get('lines_to_keep', 100)
                 suffix_this_file = config_for_this_file.get('suffix', "(1)")
 
+                if split_by_column_this_file:
+                    # Tách theo cột luôn đọc theo luồng
+                    streaming_supported = True
+                else:
+                    streaming_supported = streaming_supported_for(uploaded_file.name, "split" if do_split_this_file else "convert",
+                                                                  bool(batch_row_filters or batch_columns))
+                file_plan = plan_execution(uploaded_file.size, uploaded_file.name, streaming_supported)
+                if file_plan.mode == REJECT:
+                    st.error(file_plan.reason)
+                    continue
+                elif file_plan.mode == STREAMING:
+                    st.info(file_plan.reason)
+
                 # Write uploaded file to a temporary location to be able to read multiple times if needed
                 temp_input_file_path = temp_upload_dir / uploaded_file.name
                 with open(temp_input_file_path, "wb") as f:
@@ -359,16 +563,40 @@ elif function_choice == "Xử lý File Hàng loạt":
                 files_after_split = []
 
                 # --- Step A: Split file if requested ---
-                if do_split_this_file:
+                if split_by_column_this_file:
+                    partition_column_this_file = config_for_this_file.get('partition_column')
+                    st.info(f"Đang tách file: {uploaded_file.name} theo giá trị cột '{partition_column_this_file}'...")
+
+                    with open(temp_input_file_path, "rb") as f_temp_read:
+                        partition_files = split_file_by_column(
+                            f_temp_read,
+                            partition_column_this_file,
+                            temp_processed_dir,
+                            uploaded_file.name,
+                            output_format_select,
+                            output_compression,
+                            batch_row_filters,
+                            batch_columns,
+                            config_for_this_file.get('max_open_files', DEFAULT_MAX_OPEN_PARTITIONS)
+                        )
+                    if partition_files:
+                        # Các file phân vùng đã ở định dạng đầu ra, không cần chuyển đổi
+                        st.success(f"Đã tách '{uploaded_file.name}' thành {len(partition_files)} file theo cột '{partition_column_this_file}'.")
+                        processed_files_info.extend(partition_files)
+                    else:
+                        st.error(f"Không thể tách file '{uploaded_file.name}' theo cột '{partition_column_this_file}'.")
+                elif do_split_this_file:
                     st.info(f"Đang tách file: {uploaded_file.name} với {lines_to_keep_this_file} dòng/hàng và hậu tố '{suffix_this_file}'...")
                     
                     with open(temp_input_file_path, "rb") as f_temp_read:
                         split_original_part, split_new_part = split_file_by_rows(
-                            BytesIO(f_temp_read.read()),
+                            f_temp_read,
                             lines_to_keep_this_file,
                             temp_processed_dir,
                             uploaded_file.name,
-                            suffix_this_file
+                            suffix_this_file,
+                            batch_row_filters,
+                            batch_columns
                         )
                     if split_original_part and split_new_part:
                         st.success(f"Đã tách '{uploaded_file.name}'. Phần gốc: {split_original_part.name}, Phần mới: {split_new_part.name}")
@@ -386,7 +614,7 @@ elif function_choice == "Xử lý File Hàng loạt":
                         continue
 
                     # Determine actual input format based on file extension for conversion
-                    actual_input_format = Path(file_for_conversion_path.name).suffix.lower().replace('.', '')
+                    actual_input_format = data_extension(file_for_conversion_path.name).replace('.', '')
                     if actual_input_format == 'xls':
                         actual_input_format = 'xlsx'
 
@@ -394,11 +622,15 @@ elif function_choice == "Xử lý File Hàng loạt":
                     
                     with open(file_for_conversion_path, "rb") as f_read_for_convert:
                         converted_filepath, converted_df = convert_single_file(
-                            BytesIO(f_read_for_convert.read()),
+                            f_read_for_convert,
                             actual_input_format,
                             output_format_select,
                             temp_processed_dir,
-                            file_for_conversion_path.name
+                            file_for_conversion_path.name,
+                            output_compression,
+                            # Nếu file đã được tách thì việc lọc đã áp dụng khi tách
+                            None if do_split_this_file else batch_row_filters,
+                            None if do_split_this_file else batch_columns
                         )
 
                     if converted_filepath:
@@ -446,6 +678,223 @@ elif function_choice == "Xử lý File Hàng loạt":
             if temp_processed_dir.exists():
                 shutil.rmtree(temp_processed_dir)
 
+# --- Chức năng Kiểm tra Trùng Mã ---
+elif function_choice == "Kiểm tra Trùng Mã":
+    st.header("🔍 Kiểm tra Trùng Mã trên Toàn bộ Kho Mã")
+    st.write(f"Quét tất cả các file CSV trong thư mục `{directory_to_check}` để tìm mã được phát hành nhiều hơn một lần. "
+             "Dữ liệu được phân vùng trên đĩa nên không cần tải toàn bộ kho mã vào bộ nhớ.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        audit_memory_mb = st.number_input("Giới hạn RAM (MB):", min_value=64, value=512, step=64)
+    with col2:
+        audit_workers = st.number_input("Số tiến trình song song:", min_value=1, value=os.cpu_count() or 1, step=1)
+    audit_merge = st.checkbox("Tạo thêm file gộp đã loại trùng cho mỗi tiền tố")
+
+    if st.button("Bắt đầu kiểm tra"):
+        if not os.path.isdir(directory_to_check):
+            st.error(f"Đường dẫn thư mục không hợp lệ: `{directory_to_check}`. Vui lòng kiểm tra lại.")
+        else:
+            job_id = get_job_runner().submit("audit", {
+                "directory_to_check": directory_to_check,
+                "memory_limit_mb": int(audit_memory_mb),
+                "workers": int(audit_workers),
+                "merge": audit_merge,
+            })
+            st.success(f"Đã gửi tác vụ nền `{job_id}`. Xem tiến trình và tải báo cáo tại mục **Tác vụ nền**.")
+
+# --- Chức năng Tra cứu Mã Hàng loạt ---
+elif function_choice == "Tra cứu Mã Hàng loạt":
+    st.header("🔎 Tra cứu Mã Hàng loạt")
+    st.write("Kiểm tra danh sách mã có được phát hành hay không và nằm trong file nào, dựa trên chỉ mục "
+             f"được lập từ các file CSV trong thư mục `{directory_to_check}`.")
+
+    st.subheader("1. Chỉ mục mã")
+    if CODE_INDEX_PATH.exists():
+        st.info(f"Chỉ mục hiện có: `{CODE_INDEX_PATH}`. Cập nhật lại sau khi có file mã mới (chỉ đọc lại file mới hoặc đã thay đổi).")
+    else:
+        st.warning("Chưa có chỉ mục mã. Vui lòng cập nhật chỉ mục trước khi tra cứu.")
+    if st.button("Cập nhật chỉ mục (chạy nền)"):
+        job_id = get_job_runner().submit("build_index", {
+            "directory_to_check": directory_to_check,
+            "index_path": str(CODE_INDEX_PATH),
+        })
+        st.success(f"Đã gửi tác vụ nền `{job_id}`. Xem tiến trình tại mục **Tác vụ nền**.")
+
+    st.subheader("2. Danh sách mã cần tra cứu")
+    pasted_codes = st.text_area("Dán mã (mỗi dòng một mã):", height=150)
+    uploaded_codes_file = st.file_uploader("Hoặc tải lên file mã (.txt, .csv, có thể nén .gz/.zst):", type=["txt", "csv", "gz", "zst"])
+
+    if st.button("Tra cứu"):
+        if uploaded_codes_file is not None:
+            codes_to_verify = read_codes_to_verify(uploaded_codes_file, uploaded_codes_file.name)
+        else:
+            codes_to_verify = [line.strip().upper() for line in pasted_codes.splitlines() if line.strip()]
+
+        if not codes_to_verify:
+            st.warning("Vui lòng dán hoặc tải lên ít nhất một mã.")
+        else:
+            try:
+                with st.spinner(f"Đang tra cứu {len(codes_to_verify)} mã..."):
+                    lookup_results = lookup_codes(codes_to_verify, CODE_INDEX_PATH)
+                    LOOKUP_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+                    result_path = LOOKUP_RESULTS_DIR / f"lookup_results_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                    found_count = write_lookup_results(lookup_results, result_path)
+
+                st.success(f"Tìm thấy **{found_count}** / {len(codes_to_verify)} mã. "
+                           f"Không tìm thấy: **{len(codes_to_verify) - found_count}** mã.")
+                st.dataframe(pd.DataFrame([(code, found, "; ".join(source_files)) for code, found, source_files in lookup_results[:100]],
+                                         columns=["code", "found", "source_files"]))
+                with open(result_path, "rb") as f:
+                    st.download_button(
+                        label=f"Tải xuống {result_path.name}",
+                        data=f.read(),
+                        file_name=result_path.name,
+                        mime="text/csv"
+                    )
+            except ValueError as e:
+                st.error(f"Lỗi: {e}")
+
+# --- Chức năng Tác vụ nền ---
+elif function_choice == "Tác vụ nền":
+    st.header("⏳ Tác vụ nền")
+    st.write("Các tác vụ chạy nền tiếp tục chạy kể cả khi bạn thao tác trên giao diện hoặc đóng trình duyệt.")
+
+    job_runner = get_job_runner()
+    st.button("Làm mới trạng thái")
+
+    jobs = job_runner.list_jobs()
+    if not jobs:
+        st.info("Chưa có tác vụ nền nào.")
+
+    status_labels = {
+        JOB_QUEUED: "🕒 Đang chờ",
+        JOB_RUNNING: "⚙️ Đang chạy",
+        JOB_DONE: "✅ Hoàn tất",
+        JOB_FAILED: "❌ Thất bại",
+    }
+    for job in jobs:
+        created = pd.Timestamp(job["created_at"], unit="s").strftime("%Y-%m-%d %H:%M:%S")
+        with st.expander(f"`{job['id']}` — {job['kind']} — {status_labels.get(job['status'], job['status'])} ({created})"):
+            st.progress(min(1.0, max(0.0, job["progress"])))
+            st.text(job["message"])
+
+            if job["status"] == JOB_FAILED:
+                st.error(f"Lỗi: {job['error']}")
+
+            if job["status"] == JOB_DONE and job["result"]:
+                for output_file in job["result"].get("output_files", []):
+                    output_file = Path(output_file)
+                    if not output_file.exists():
+                        st.warning(f"File `{output_file.name}` không còn tồn tại.")
+                        continue
+                    with open(output_file, "rb") as f:
+                        st.download_button(
+                            label=f"Tải xuống {output_file.name}",
+                            data=f.read(),
+                            file_name=output_file.name,
+                            key=f"download_{job['id']}_{output_file.name}"
+                        )
+
+            if job["status"] in (JOB_DONE, JOB_FAILED):
+                if st.button("Xóa tác vụ", key=f"delete_{job['id']}"):
+                    job_runner.delete_job(job["id"])
+                    st.rerun()
+
+# --- Chức năng Thư mục Theo dõi ---
+elif function_choice == "Thư mục Theo dõi":
+    st.header("📂 Thư mục Theo dõi (Watch Folder)")
+    st.write("Thả file vào một thư mục trên máy chủ để được xử lý tự động, không cần tải lên qua trình duyệt. "
+             "File đang xử lý được chuyển vào `processing/`, sau đó vào `done/` (kèm thư mục `<tên file>_output/`) hoặc `failed/`.")
+
+    folder_watchers = get_folder_watchers()
+    watch_dir_input = st.text_input("Đường dẫn thư mục theo dõi", value=os.environ.get("WATCH_FOLDER", str(OUTPUT_DIR / "watch")))
+    watch_task = st.selectbox(
+        "Tác vụ áp dụng cho file mới:",
+        ("convert", "batch", "generate_excel"),
+        format_func=lambda task: {
+            "convert": "Chuyển đổi định dạng",
+            "batch": "Tách + chuyển đổi (hàng loạt)",
+            "generate_excel": "Tạo mã từ file Excel",
+        }[task]
+    )
+
+    watch_task_params = {}
+    if watch_task == "convert":
+        watch_task_params = {
+            "target_format": st.radio("Chuyển đổi sang:", ('csv', 'excel', 'txt'), key="watch_target_format"),
+            "compression": output_compression,
+        }
+    elif watch_task == "batch":
+        watch_task_params = {
+            "output_format": st.selectbox("Chuyển đổi sang định dạng:", ("csv", "xlsx", "txt"), key="watch_output_format"),
+            "compression": output_compression,
+        }
+        watch_split_by = st.radio(
+            "Tách mỗi file:",
+            ("none", "rows", "column"),
+            format_func=lambda mode: {"none": "Không tách", "rows": "Theo số dòng", "column": "Theo giá trị cột"}[mode],
+            key="watch_split_by"
+        )
+        if watch_split_by == "rows":
+            watch_task_params["split_config"] = {
+                "do_split": True,
+                "lines_to_keep": int(st.number_input("Số dòng/hàng để giữ trong phần gốc:", min_value=1, value=100, key="watch_lines")),
+                "suffix": st.text_input("Hậu tố cho file tách mới:", value="(1)", key="watch_suffix"),
+            }
+        elif watch_split_by == "column":
+            watch_task_params["split_config"] = {
+                "do_split": True,
+                "split_by": "column",
+                "partition_column": st.text_input("Cột dùng để tách:", key="watch_partition_column").strip(),
+                "max_open_files": int(st.number_input("Số file đầu ra mở cùng lúc tối đa:", min_value=1,
+                                                      value=DEFAULT_MAX_OPEN_PARTITIONS, key="watch_max_open")),
+            }
+    else:
+        watch_task_params = {"directory_to_check": directory_to_check, "compression": output_compression}
+
+    watch_filters_valid = True
+    if watch_task in ("convert", "batch"):
+        watch_row_filters, watch_columns, watch_filters_valid = row_filter_inputs("watch")
+        watch_task_params.update({"row_filters": watch_row_filters, "columns": watch_columns})
+
+    watch_max_in_flight = st.number_input("Số file xử lý đồng thời tối đa:", min_value=1, value=4, step=1)
+
+    watch_key = os.path.abspath(watch_dir_input)
+    active_watcher = folder_watchers.get(watch_key)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Bắt đầu theo dõi"):
+            if active_watcher is not None and active_watcher.is_running():
+                st.warning("Thư mục này đang được theo dõi. Dừng trước khi đổi cấu hình.")
+            elif watch_task_params.get("split_config", {}).get("split_by") == "column" and not watch_task_params["split_config"]["partition_column"]:
+                st.warning("Vui lòng nhập cột dùng để tách.")
+            elif not watch_filters_valid:
+                st.warning("Vui lòng sửa điều kiện lọc trước khi bắt đầu theo dõi.")
+            else:
+                try:
+                    active_watcher = FolderWatcher(watch_key, get_job_runner(), watch_task, watch_task_params,
+                                                   max_in_flight=int(watch_max_in_flight))
+                    active_watcher.start()
+                    folder_watchers[watch_key] = active_watcher
+                    st.success(f"Đang theo dõi `{watch_key}`.")
+                except Exception as e:
+                    st.error(f"Không thể bắt đầu theo dõi thư mục: {e}")
+    with col2:
+        if st.button("Dừng theo dõi") and active_watcher is not None:
+            active_watcher.stop()
+            st.info(f"Đã dừng theo dõi `{watch_key}`.")
+
+    if folder_watchers:
+        st.subheader("Thư mục đang được theo dõi")
+        st.button("Làm mới trạng thái", key="refresh_watchers")
+        for watched_dir, watcher in folder_watchers.items():
+            watcher_status = watcher.status()
+            state = "🟢 Đang chạy" if watcher.is_running() else "⚪ Đã dừng"
+            st.markdown(f"- `{watched_dir}` — {watcher.task} — {state} — chờ: {watcher_status['inbox']}, "
+                        f"đang xử lý: {watcher_status['processing']}, xong: {watcher_status['done']}, lỗi: {watcher_status['failed']}")
+
 # --- Chức năng Thông tin ---
 elif function_choice == "Thông tin":
     st.header("ℹ️ Thông tin Ứng dụng")
@@ -1,16 +1,66 @@
 # scripts/batch_processor.py (Đã sửa đổi hàm split_file_by_rows để hỗ trợ nhiều định dạng)
 import pandas as pd
 import os
+import pickle
+import re
 import shutil
+import tempfile
+from collections import OrderedDict
 from pathlib import Path
 from io import BytesIO
 
-def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original_filename, suffix="(1)"):
+from .compression import (open_text, detect_compression, decompress_stream, open_input_stream,
+                          split_compression_suffix, data_extension, with_compression_suffix)
+from .streaming_io import (ChunkWriter, iter_dataframe_chunks, iter_filtered_chunks, convert_streaming,
+                           txt_fields_needed, TXT_LINE_COLUMN)
+from .row_filter import apply_row_filters, select_columns, resolve_column, filter_columns_needed
+from .memory_planner import plan_execution, stream_size, streaming_supported_for, STREAMING, REJECT
+
+# Số file phân vùng mở cùng lúc tối đa khi tách theo giá trị cột
+DEFAULT_MAX_OPEN_PARTITIONS = 64
+# Số giá trị khác nhau tối đa của cột dùng để tách
+MAX_PARTITIONS = 10000
+
+def _split_streaming(uploaded_file_stream, original_filename, lines_to_keep, original_part_path, split_part_path,
+                     row_filters=None, columns=None):
+    """
+    Streams the input once, applies row filters / column selection and routes the first
+    'lines_to_keep' matching rows to the original part and the rest to the split part.
+    TXT lines are copied as is unless columns are selected, like the in-memory split.
+    """
+    file_extension = data_extension(original_filename)
+    output_format = 'xlsx' if file_extension in ['.xlsx', '.xls'] else file_extension.lstrip('.')
+    raw_lines = file_extension == '.txt' and not columns
+    with ChunkWriter(original_part_path, output_format, raw_lines) as first_part, \
+            ChunkWriter(split_part_path, output_format, raw_lines) as second_part:
+        for chunk in iter_filtered_chunks(uploaded_file_stream, original_filename, file_extension, row_filters, columns,
+                                          raw_lines=raw_lines):
+            room = max(0, lines_to_keep - first_part.rows_written)
+            if room or first_part.rows_written == 0:
+                first_part.write(chunk.iloc[:room])
+            second_part.write(chunk.iloc[room:])
+        total_rows = first_part.rows_written + second_part.rows_written
+
+    if lines_to_keep >= total_rows or lines_to_keep <= 0:
+        os.remove(original_part_path)
+        os.remove(split_part_path)
+        raise ValueError(f"Số hàng cần giữ ({lines_to_keep}) không hợp lệ. Phải lớn hơn 0 và nhỏ hơn tổng số hàng khớp điều kiện lọc ({total_rows}).")
+
+def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original_filename, suffix="(1)",
+                       row_filters=None, columns=None):
     """
     Splits a file (TXT, CSV, Excel) into two parts based on a specified row/line number.
 
     The first part retains the original filename (without suffix), and the second part
-    is saved with a new filename containing a suffix.
+    is saved with a new filename containing a suffix. gzip/zstd compressed TXT/CSV inputs
+    ('.csv.gz', '.txt.zst', ...) are decompressed while reading and both parts are
+    written with the same compression.
+
+    If row filters or a column selection are given (see scripts/row_filter.py), the
+    input is streamed in chunks and only matching rows / selected columns are kept;
+    'lines_to_keep' then counts matching rows. Files too large to load within the
+    memory budget (see scripts/memory_planner.py) take the same streaming path, and
+    files that cannot fit even when streamed are rejected.
 
     Args:
         uploaded_file_stream: Streamlit UploadedFile object (BytesIO stream).
@@ -18,18 +68,44 @@ def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original
         output_dir (Path): The directory to save the split files.
         original_filename (str): The original name of the uploaded file.
         suffix (str): The suffix to add to the new split file's name (e.g., "(1)").
+        row_filters (list): Optional filters from parse_row_filters.
+        columns (list): Optional columns to keep, in order.
 
     Returns:
         tuple: (path_to_original_part_file, path_to_split_part_file) if successful, else (None, None).
     """
     try:
         uploaded_file_stream.seek(0) # Ensure cursor is at the beginning
-        file_extension = Path(original_filename).suffix.lower()
+        compression = detect_compression(uploaded_file_stream, original_filename)
+        input_stream = decompress_stream(uploaded_file_stream, compression)
+        data_filename = split_compression_suffix(original_filename)[0]
+        file_extension = Path(data_filename).suffix.lower()
+
+        # Construct output file paths
+        base_name, ext = os.path.splitext(data_filename)
+        output_compression = compression if file_extension in ['.txt', '.csv'] else None
+        original_part_path = output_dir / with_compression_suffix(f"{base_name}{ext}", output_compression) # Retains original name
+        split_part_path = output_dir / with_compression_suffix(f"{base_name} {suffix}{ext}", output_compression) # Adds suffix
+
+        filtered = bool(row_filters or columns)
+        plan = plan_execution(stream_size(uploaded_file_stream), original_filename,
+                              streaming_supported_for(original_filename, "split", filtered))
+        if plan.mode == REJECT:
+            raise ValueError(plan.reason)
+
+        if filtered or plan.mode == STREAMING:
+            if file_extension not in ['.txt', '.csv', '.xlsx', '.xls']:
+                raise ValueError(f"Định dạng file '{file_extension}' không được hỗ trợ để tách.")
+            if plan.mode == STREAMING:
+                print(plan.reason)
+            _split_streaming(uploaded_file_stream, original_filename, lines_to_keep, original_part_path,
+                             split_part_path, row_filters, columns)
+            return original_part_path, split_part_path
 
         df = None
         # Read file based on its extension
         if file_extension == '.txt':
-            lines = [line.decode('utf-8').strip() for line in uploaded_file_stream.readlines()]
+            lines = [line.decode('utf-8').strip() for line in input_stream]
             lines = [line for line in lines if line] # Remove empty strings
             if not lines:
                 raise ValueError("File trống hoặc không có dòng dữ liệu hợp lệ để tách.")
@@ -42,7 +118,7 @@ def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original
             split_content = '\n'.join(lines[lines_to_keep:])
 
         elif file_extension == '.csv':
-            df = pd.read_csv(uploaded_file_stream)
+            df = pd.read_csv(input_stream)
             total_rows = len(df)
             if lines_to_keep >= total_rows or lines_to_keep <= 0:
                 raise ValueError(f"Số hàng cần giữ ({lines_to_keep}) không hợp lệ. Phải lớn hơn 0 và nhỏ hơn tổng số hàng ({total_rows}).")
@@ -53,7 +129,7 @@ def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original
         elif file_extension in ['.xlsx', '.xls']:
             # Read only the first sheet for simplicity. If multiple sheets need splitting,
             # this logic would become more complex (e.g., looping through sheets).
-            df = pd.read_excel(uploaded_file_stream, engine='openpyxl')
+            df = pd.read_excel(input_stream, engine='openpyxl')
             total_rows = len(df)
             if lines_to_keep >= total_rows or lines_to_keep <= 0:
                 raise ValueError(f"Số hàng cần giữ ({lines_to_keep}) không hợp lệ. Phải lớn hơn 0 và nhỏ hơn tổng số hàng ({total_rows}).")
@@ -64,20 +140,17 @@ def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original
         else:
             raise ValueError(f"Định dạng file '{file_extension}' không được hỗ trợ để tách.")
 
-        # Construct output file paths
-        base_name, ext = os.path.splitext(original_filename)
-        original_part_path = output_dir / f"{base_name}{ext}" # Retains original name
-        split_part_path = output_dir / f"{base_name} {suffix}{ext}" # Adds suffix
-
         # Save the split parts back to files
         if file_extension == '.txt':
-            with open(original_part_path, 'w', encoding='utf-8') as f:
+            with open_text(original_part_path, 'w') as f:
                 f.write(original_content)
-            with open(split_part_path, 'w', encoding='utf-8') as f:
+            with open_text(split_part_path, 'w') as f:
                 f.write(split_content)
         elif file_extension == '.csv':
-            df_original.to_csv(original_part_path, index=False, encoding='utf-8')
-            df_split.to_csv(split_part_path, index=False, encoding='utf-8')
+            with open_text(original_part_path, 'w') as f:
+                df_original.to_csv(f, index=False)
+            with open_text(split_part_path, 'w') as f:
+                df_split.to_csv(f, index=False)
         elif file_extension in ['.xlsx', '.xls']:
             df_original.to_excel(original_part_path, index=False, engine='openpyxl')
             df_split.to_excel(split_part_path, index=False, engine='openpyxl')
@@ -91,32 +164,236 @@ def split_file_by_rows(uploaded_file_stream, lines_to_keep, output_dir, original
         print(f"Đã xảy ra lỗi khi tách file '{original_filename}': {e}")
         return None, None
 
+class _PartitionHandles:
+    """
+    Append handles for the per-key partition files, at most 'max_open' open at a time.
+    The least recently used handle is closed when a new one is needed and reopened in
+    append mode the next time its key shows up.
+
+    'spill_format' is 'csv' / 'txt' to write the final file directly (gzip/zstd
+    compressed if its name ends in '.gz' / '.zst': each reopen appends a new gzip
+    member / zstd frame, which readers decompress as one stream), or 'pickle' to
+    spool DataFrame chunks (dtypes kept) for a final write to xlsx. With
+    'raw_lines', TXT rows are the original lines of a TXT input and are written
+    as is.
+    """
+
+    def __init__(self, max_open, spill_format, raw_lines=False):
+        self.max_open = max(1, max_open)
+        self.spill_format = spill_format
+        self.raw_lines = raw_lines
+        self._handles = OrderedDict()
+        self._started = set()
+
+    def append(self, path, df):
+        handle = self._handles.pop(path, None)
+        if handle is None:
+            if len(self._handles) >= self.max_open:
+                _, oldest = self._handles.popitem(last=False)
+                oldest.close()
+            # Lần đầu ghi đè file cũ cùng tên, các lần mở lại thì ghi tiếp
+            mode = 'a' if path in self._started else 'w'
+            if self.spill_format == 'pickle':
+                handle = open(path, mode + 'b')
+            else:
+                handle = open_text(path, mode)
+        self._handles[path] = handle
+
+        if self.spill_format == 'pickle':
+            pickle.dump(df, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        elif self.spill_format == 'csv':
+            df.to_csv(handle, index=False, header=path not in self._started)
+        elif self.raw_lines:
+            # Như ChunkWriter: các dòng cách nhau bởi '\n', không có xuống dòng ở cuối file
+            handle.write(("\n" if path in self._started else "") + "\n".join(df.iloc[:, 0]))
+        else:
+            df.to_csv(handle, sep='\t', index=False, header=False)
+        self._started.add(path)
+
+    def close(self):
+        while self._handles:
+            self._handles.popitem()[1].close()
+
+
+def _iter_spilled_chunks(spill_path):
+    with open(spill_path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _partition_label(value):
+    """File-name-safe text for a partition key ('5.0' read from Excel becomes '5')."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return "(trống)"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    label = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', str(value)).strip().strip('.')
+    return label[:100] or "(trống)"
+
+
+def split_file_by_column(uploaded_file_stream, partition_column, output_dir, original_filename, output_format=None,
+                         compression=None, row_filters=None, columns=None, max_open_files=DEFAULT_MAX_OPEN_PARTITIONS,
+                         max_partitions=MAX_PARTITIONS):
+    """
+    Splits a file (TXT, CSV, Excel) into one file per distinct value of 'partition_column',
+    named '<name>_<value><ext>' (e.g. 'orders_North.csv').
+
+    The input is streamed once in chunks; each chunk's rows are appended to the file of
+    their key, with at most 'max_open_files' files open at a time (least recently used
+    files are closed and reopened in append mode). CSV/TXT partitions, gzip/zstd
+    compressed or not, are appended to directly; XLSX partitions are spooled to
+    temporary files and written out one at a time at the end. Row filters and
+    column selection are applied while reading, as in split_file_by_rows.
+
+    Args:
+        uploaded_file_stream: Streamlit UploadedFile object or opened binary file.
+        partition_column: Column name (or 0-based number for TXT files) to split on.
+        output_dir (Path): The directory to save the partition files.
+        original_filename (str): The original name of the uploaded file.
+        output_format (str): 'csv', 'txt' or 'xlsx'; None keeps the input format and its compression.
+        compression (str): 'gzip', 'zstd' or None for CSV/TXT partitions when 'output_format' is given.
+        row_filters (list): Optional filters from parse_row_filters.
+        columns (list): Optional columns to keep, in order.
+        max_open_files (int): Maximum number of partition files open at once.
+        max_partitions (int): Maximum number of distinct values (guards against splitting on a unique column).
+
+    Returns:
+        list: Paths of the partition files in order of first appearance, or None on error.
+    """
+    output_dir = Path(output_dir)
+    spill_dir = None
+    handles = None
+    output_paths = {}
+    try:
+        uploaded_file_stream.seek(0)
+        input_compression = detect_compression(uploaded_file_stream, original_filename)
+        data_filename = split_compression_suffix(original_filename)[0]
+        file_extension = Path(data_filename).suffix.lower()
+        if file_extension not in ['.txt', '.csv', '.xlsx', '.xls']:
+            raise ValueError(f"Định dạng file '{file_extension}' không được hỗ trợ để tách.")
+
+        if output_format is None:
+            output_format = 'xlsx' if file_extension in ['.xlsx', '.xls'] else file_extension.lstrip('.')
+            compression = input_compression
+        if output_format not in ('csv', 'txt', 'xlsx'):
+            raise ValueError(f"Định dạng đầu ra '{output_format}' không được hỗ trợ.")
+        if output_format == 'xlsx':
+            compression = None
+
+        base_name = os.path.splitext(data_filename)[0]
+        direct = output_format in ('csv', 'txt')
+        if not direct:
+            spill_dir = Path(tempfile.mkdtemp(prefix=".partitions_", dir=output_dir))
+        # TXT không chọn cột: mỗi dòng được ghi nguyên văn vào file của giá trị cột dùng để tách
+        raw_lines = file_extension == '.txt' and output_format == 'txt' and not columns
+        handles = _PartitionHandles(max_open_files, output_format if direct else 'pickle', raw_lines)
+
+        # Cột dùng để tách phải được đọc kể cả khi không nằm trong các cột được giữ lại
+        usecols = filter_columns_needed(row_filters, columns) if file_extension == '.csv' else None
+        if usecols and partition_column not in usecols:
+            usecols.append(partition_column)
+        txt_fields = txt_fields_needed(row_filters, [partition_column]) if raw_lines else None
+
+        used_names = set()
+        spill_paths = {}
+        for chunk in iter_dataframe_chunks(uploaded_file_stream, original_filename, file_extension, usecols=usecols,
+                                           txt_lines=raw_lines, txt_fields=txt_fields):
+            chunk = apply_row_filters(chunk, row_filters)
+            if chunk.empty:
+                continue
+            key_column = resolve_column(chunk, partition_column)
+            for key, group in chunk.groupby(key_column, sort=False, dropna=False):
+                if pd.isna(key):
+                    key = None
+                if key not in output_paths:
+                    if len(output_paths) >= max_partitions:
+                        raise ValueError(f"Cột '{partition_column}' có hơn {max_partitions} giá trị khác nhau. Vui lòng chọn cột khác để tách.")
+                    label = _partition_label(key)
+                    name = f"{base_name}_{label}.{output_format}"
+                    duplicate = 2
+                    while name.lower() in used_names:
+                        # Hai giá trị khác nhau cho cùng tên file (vd. 'a/b' và 'a_b')
+                        name = f"{base_name}_{label} ({duplicate}).{output_format}"
+                        duplicate += 1
+                    used_names.add(name.lower())
+                    output_paths[key] = output_dir / with_compression_suffix(name, compression)
+                    spill_paths[key] = output_paths[key] if direct else spill_dir / f"{len(spill_paths)}.pkl"
+                if raw_lines:
+                    group = group[[TXT_LINE_COLUMN]]
+                handles.append(spill_paths[key], select_columns(group, columns))
+        handles.close()
+
+        if not output_paths:
+            raise ValueError("Không có hàng nào để tách (file trống hoặc không hàng nào khớp điều kiện lọc).")
+
+        if not direct:
+            for key, output_path in output_paths.items():
+                with ChunkWriter(output_path, output_format) as writer:
+                    for df in _iter_spilled_chunks(spill_paths[key]):
+                        writer.write(df)
+                os.remove(spill_paths[key])
+
+        return list(output_paths.values())
+
+    except Exception as e:
+        if handles is not None:
+            handles.close()
+        for output_path in output_paths.values():
+            Path(output_path).unlink(missing_ok=True)
+        if isinstance(e, ValueError):
+            print(f"Lỗi logic khi tách file '{original_filename}' theo cột: {e}")
+        else:
+            print(f"Đã xảy ra lỗi khi tách file '{original_filename}' theo cột: {e}")
+        return None
+    finally:
+        if spill_dir is not None:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
 # Giữ nguyên các hàm convert_single_file và create_zip_archive
-def convert_single_file(uploaded_file_stream, input_format, output_format, output_dir, original_filename):
-    # ... (Nội dung hàm này giữ nguyên như trước) ...
+def convert_single_file(uploaded_file_stream, input_format, output_format, output_dir, original_filename, compression=None,
+                        row_filters=None, columns=None):
+    # gzip/zstd inputs are detected from magic bytes; 'compression' ('gzip'/'zstd') compresses CSV/TXT outputs.
+    # With row_filters/columns, or when the memory planner says the file is too large to load at once,
+    # the input is streamed and the returned DataFrame is only a preview of the output.
     df = None
     try:
-        uploaded_file_stream.seek(0) # Reset stream position
+        filtered = bool(row_filters or columns)
+        plan = plan_execution(stream_size(uploaded_file_stream), original_filename,
+                              streaming_supported_for(f"input.{input_format}", "convert", filtered))
+        if plan.mode == REJECT:
+            raise ValueError(plan.reason)
+
+        if filtered or plan.mode == STREAMING:
+            if plan.mode == STREAMING:
+                print(plan.reason)
+            base_name = Path(split_compression_suffix(original_filename)[0]).stem
+            output_compression = compression if output_format in ['csv', 'txt'] else None
+            output_filepath = output_dir / with_compression_suffix(f"{base_name}_converted.{output_format}", output_compression)
+            _, preview_df = convert_streaming(
+                uploaded_file_stream, original_filename, output_filepath, output_format, f".{input_format}",
+                row_filters, columns
+            )
+            return output_filepath, preview_df
 
         # Read input file into DataFrame
         if input_format == 'csv':
-            df = pd.read_csv(uploaded_file_stream)
+            df = pd.read_csv(open_input_stream(uploaded_file_stream, original_filename))
         elif input_format in ['xlsx', 'xls']:
-            df = pd.read_excel(uploaded_file_stream, engine='openpyxl')
+            df = pd.read_excel(open_input_stream(uploaded_file_stream, original_filename), engine='openpyxl')
         elif input_format == 'txt':
             # Attempt to read TXT assuming tab-separated, then space-separated, then single column
             try:
-                df = pd.read_csv(uploaded_file_stream, sep='\t', header=None, encoding='utf-8')
+                df = pd.read_csv(open_input_stream(uploaded_file_stream, original_filename), sep='\t', header=None, encoding='utf-8')
             except pd.errors.ParserError:
-                uploaded_file_stream.seek(0)
                 try:
-                    df = pd.read_csv(uploaded_file_stream, sep=' ', header=None, encoding='utf-8')
+                    df = pd.read_csv(open_input_stream(uploaded_file_stream, original_filename), sep=' ', header=None, encoding='utf-8')
                 except pd.errors.ParserError:
-                    uploaded_file_stream.seek(0)
-                    df = pd.DataFrame([line.decode('utf-8').strip() for line in uploaded_file_stream.readlines()], columns=['Content'])
+                    df = pd.DataFrame([line.decode('utf-8').strip() for line in open_input_stream(uploaded_file_stream, original_filename)], columns=['Content'])
             except Exception: # Fallback for other issues, read as single column
-                uploaded_file_stream.seek(0)
-                df = pd.DataFrame([line.decode('utf-8').strip() for line in uploaded_file_stream.readlines()], columns=['Content'])
+                df = pd.DataFrame([line.decode('utf-8').strip() for line in open_input_stream(uploaded_file_stream, original_filename)], columns=['Content'])
         else:
             raise ValueError(f"Định dạng đầu vào '{input_format}' không được hỗ trợ.")
 
@@ -124,17 +401,20 @@ def convert_single_file(uploaded_file_stream, input_format, output_format, outpu
             raise ValueError("Không thể đọc file đầu vào vào DataFrame.")
 
         # Prepare output path
-        base_name = Path(original_filename).stem
-        output_filepath = output_dir / f"{base_name}_converted.{output_format}"
+        base_name = Path(split_compression_suffix(original_filename)[0]).stem
+        output_compression = compression if output_format in ['csv', 'txt'] else None
+        output_filepath = output_dir / with_compression_suffix(f"{base_name}_converted.{output_format}", output_compression)
 
         # Write DataFrame to output format
         if output_format == 'csv':
-            df.to_csv(output_filepath, index=False, encoding='utf-8')
+            with open_text(output_filepath, 'w') as f:
+                df.to_csv(f, index=False)
         elif output_format == 'xlsx':
             df.to_excel(output_filepath, index=False, engine='openpyxl')
         elif output_format == 'txt':
             # For TXT output, write as tab-separated without header/index
-            df.to_csv(output_filepath, sep='\t', index=False, header=False, encoding='utf-8')
+            with open_text(output_filepath, 'w') as f:
+                df.to_csv(f, sep='\t', index=False, header=False)
         else:
             raise ValueError(f"Định dạng đầu ra '{output_format}' không được hỗ trợ.")
 
@@ -151,4 +431,104 @@ def create_zip_archive(source_dir, output_zip_path_without_ext):
         return Path(str(output_zip_path_without_ext) + '.zip')
     except Exception as e:
         print(f"Lỗi khi tạo file zip từ '{source_dir}': {e}")
-        return None
\ No newline at end of file
+        return None
+
+def process_batch_files(input_paths, output_format, split_configs, output_dir, progress_callback=None, compression=None,
+                        row_filters=None, columns=None):
+    """
+    Runs the batch pipeline (optional split, then convert) over files already on disk
+    and zips the results. Used by background jobs, which cannot rely on Streamlit
+    uploads or session state.
+
+    Args:
+        input_paths (list[Path]): Input files (.txt, .csv, .xlsx, .xls).
+        output_format (str): 'csv', 'xlsx' or 'txt'.
+        split_configs (dict): Maps a file name to {'do_split', 'lines_to_keep', 'suffix'}, or to
+            {'do_split', 'split_by': 'column', 'partition_column', 'max_open_files'} to split
+            into one output file per column value (see split_file_by_column).
+        output_dir (Path): Directory for processed files and the final ZIP.
+        progress_callback: Optional function(progress, text) to report progress.
+        compression (str): Optional 'gzip' or 'zstd' for CSV/TXT outputs.
+        row_filters (list), columns (list): Optional filtering applied while streaming
+            the input (during the split if the file is split, otherwise during conversion).
+
+    Returns:
+        tuple: (list of converted file paths, path to ZIP archive or None).
+    """
+    output_dir = Path(output_dir)
+    processed_dir = output_dir / "processed"
+    processed_dir.mkdir(parents=True, exist_ok=True)
+
+    processed_files = []
+    total_files = len(input_paths)
+
+    for file_idx, input_path in enumerate(input_paths, start=1):
+        if progress_callback:
+            progress_callback((file_idx - 1) / total_files, f"Đang xử lý file: {input_path.name} ({file_idx}/{total_files})")
+
+        config = split_configs.get(input_path.name, {})
+        files_after_split = [input_path]
+        if config.get('do_split', False) and config.get('split_by') == 'column':
+            # Tách theo giá trị cột ghi thẳng ra định dạng đầu ra, không cần bước chuyển đổi
+            with open(input_path, "rb") as f:
+                partition_files = split_file_by_column(
+                    f,
+                    config.get('partition_column'),
+                    processed_dir,
+                    input_path.name,
+                    output_format,
+                    compression,
+                    row_filters,
+                    columns,
+                    config.get('max_open_files', DEFAULT_MAX_OPEN_PARTITIONS)
+                )
+            if not partition_files:
+                print(f"Không thể tách file '{input_path.name}' theo cột. Bỏ qua file này.")
+                continue
+            processed_files.extend(partition_files)
+            continue
+        if config.get('do_split', False):
+            with open(input_path, "rb") as f:
+                split_original_part, split_new_part = split_file_by_rows(
+                    f,
+                    config.get('lines_to_keep', 100),
+                    processed_dir,
+                    input_path.name,
+                    config.get('suffix', "(1)"),
+                    row_filters,
+                    columns
+                )
+            if not (split_original_part and split_new_part):
+                print(f"Không thể tách file '{input_path.name}'. Bỏ qua chuyển đổi cho file này.")
+                continue
+            files_after_split = [split_original_part, split_new_part]
+        filter_on_convert = not config.get('do_split', False)
+
+        for file_for_conversion_path in files_after_split:
+            actual_input_format = data_extension(file_for_conversion_path.name).replace('.', '')
+            if actual_input_format == 'xls':
+                actual_input_format = 'xlsx'
+
+            with open(file_for_conversion_path, "rb") as f:
+                converted_filepath, _ = convert_single_file(
+                    f,
+                    actual_input_format,
+                    output_format,
+                    processed_dir,
+                    file_for_conversion_path.name,
+                    compression,
+                    row_filters if filter_on_convert else None,
+                    columns if filter_on_convert else None
+                )
+            if converted_filepath:
+                processed_files.append(converted_filepath)
+
+    if progress_callback:
+        progress_callback(1.0, "Đang nén các file đầu ra thành một file ZIP...")
+
+    zip_path = None
+    if processed_files:
+        zip_file_name = f"processed_files_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}"
+        zip_path = create_zip_archive(processed_dir, output_dir / zip_file_name)
+
+    return processed_files, zip_path
@@ -0,0 +1,271 @@
+# scripts/code_audit.py
+import argparse
+import csv
+import fnmatch
+import math
+import multiprocessing
+import os
+import shutil
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .compression import open_text, data_extension, split_compression_suffix, with_compression_suffix
+
+# Ước lượng số byte RAM mà một mã 16 ký tự chiếm trong dict Python (chuỗi + entry dict)
+_BYTES_PER_CODE_IN_MEMORY = 160
+# Một dòng mã trên đĩa: 16 ký tự + xuống dòng
+_BYTES_PER_CODE_ON_DISK = 17
+# File mã nén (.gz/.zst) thường nhỏ hơn 3-5 lần so với CSV gốc
+_COMPRESSION_RATIO_ESTIMATE = 4
+# Ước lượng RAM cho một dòng 'code<TAB>file_index' nằm trong bộ đệm phân vùng
+_BYTES_PER_BUFFERED_LINE = 100
+# File đầu ra của các chức năng khác (tra cứu, chuyển đổi, báo cáo trùng) có thể nằm
+# cùng thư mục với file mã nhưng không chứa mã đã phát hành
+NON_CODE_FILE_PATTERNS = ("lookup_results*", "*_converted*", "duplicates_report*")
+
+
+def iter_code_files(directory_to_check, prefix_to_match=None):
+    """
+    Yields the code CSV files in 'directory_to_check' (non-recursive, like
+    load_existing_codes, including '.csv.gz' / '.csv.zst'), optionally restricted
+    to names starting with a prefix. Known output files of the other tools
+    (NON_CODE_FILE_PATTERNS) are skipped.
+    """
+    if not os.path.isdir(directory_to_check):
+        print(f"Warning: Directory not found: {directory_to_check}.")
+        return
+    for filename in sorted(os.listdir(directory_to_check)):
+        if data_extension(filename) != ".csv":
+            continue
+        if any(fnmatch.fnmatch(filename.lower(), pattern) for pattern in NON_CODE_FILE_PATTERNS):
+            continue
+        if prefix_to_match and not filename.upper().startswith(prefix_to_match.upper()):
+            continue
+        yield Path(directory_to_check) / filename
+
+
+def iter_codes_in_file(filepath):
+    """Yields the codes (first column, header skipped) of one code CSV file."""
+    with open_text(filepath) as file:
+        reader = csv.reader(file)
+        next(reader, None) # Skip header if exists
+        for row in reader:
+            if row and row[0]:
+                yield row[0]
+
+
+def file_prefix(filepath):
+    """Prefix a code file belongs to: 'ABC.csv', 'ABC_1.csv.gz' and 'ABC_part00001.csv' -> 'ABC'."""
+    return Path(split_compression_suffix(filepath)[0]).stem.split("_")[0].upper()
+
+
+def bucket_of(code, num_buckets):
+    # crc32 thay vì hash(): hash() của str bị ngẫu nhiên hóa giữa các tiến trình
+    return zlib.crc32(code.encode("utf-8")) % num_buckets
+
+
+def _flush_spill_buffers(buffers, worker_idx, work_dir):
+    # Mở từng file bucket để ghi tiếp rồi đóng ngay: chỉ một file được mở tại một thời điểm
+    for bucket_idx, lines in enumerate(buffers):
+        if lines:
+            with open(work_dir / f"w{worker_idx:03d}_b{bucket_idx:04d}.tsv", "a", encoding="utf-8", newline="") as f:
+                f.writelines(lines)
+            lines.clear()
+
+
+def _partition_files(worker_idx, file_entries, num_buckets, work_dir, buffer_lines):
+    """
+    Phase 1 worker: streams its share of the code files and appends
+    'code<TAB>file_index' lines to one spill file per bucket.
+
+    Lines are buffered per bucket and flushed once 'buffer_lines' are buffered in
+    total, so the number of open files stays at one however many buckets there are.
+    """
+    buffers = [[] for _ in range(num_buckets)]
+    buffered = 0
+    codes_scanned = 0
+    for file_idx, filepath in file_entries:
+        try:
+            for code in iter_codes_in_file(filepath):
+                buffers[bucket_of(code, num_buckets)].append(f"{code}\t{file_idx}\n")
+                codes_scanned += 1
+                buffered += 1
+                if buffered >= buffer_lines:
+                    _flush_spill_buffers(buffers, worker_idx, work_dir)
+                    buffered = 0
+        except Exception as e:
+            print(f"Warning: Could not read codes from '{filepath}': {e}")
+    _flush_spill_buffers(buffers, worker_idx, work_dir)
+    return codes_scanned
+
+
+def _audit_bucket(bucket_idx, work_dir, file_names, file_prefixes, merge_dir):
+    """
+    Phase 2 worker: loads one bucket (a bounded slice of the corpus) into memory,
+    writes the duplicates it finds to its own report file and, if requested, the
+    deduplicated codes to per-prefix merge parts.
+    """
+    first_seen = {}
+    duplicates = {}
+    for spill_path in sorted(work_dir.glob(f"w*_b{bucket_idx:04d}.tsv")):
+        with open(spill_path, "r", encoding="utf-8") as f:
+            for line in f:
+                code, file_idx = line.rstrip("\n").split("\t")
+                file_idx = int(file_idx)
+                if code in first_seen:
+                    duplicates.setdefault(code, [first_seen[code]]).append(file_idx)
+                else:
+                    first_seen[code] = file_idx
+        os.remove(spill_path)
+
+    report_path = work_dir / f"duplicates_b{bucket_idx:04d}.csv"
+    with open(report_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        for code, file_indices in duplicates.items():
+            writer.writerow([code, len(file_indices), ";".join(file_names[i] for i in file_indices)])
+
+    if merge_dir is not None:
+        # Gom mã theo tiền tố để ghi lần lượt từng file, không mở một file cho mỗi tiền tố cùng lúc
+        codes_by_prefix = {}
+        for code, file_idx in first_seen.items():
+            codes_by_prefix.setdefault(file_prefixes[file_idx], []).append(code)
+        for prefix, codes in codes_by_prefix.items():
+            prefix_dir = merge_dir / prefix
+            prefix_dir.mkdir(parents=True, exist_ok=True)
+            with open(prefix_dir / f"b{bucket_idx:04d}.part", "w", encoding="utf-8", newline="") as f:
+                f.writelines(code + "\n" for code in codes)
+
+    return len(first_seen), len(duplicates)
+
+
+def _concat_files(part_paths, output_path, header=None):
+    with open_text(output_path, "w") as out:
+        if header:
+            out.write(header + "\n")
+        for part_path in part_paths:
+            with open(part_path, "r", encoding="utf-8", newline="") as part:
+                shutil.copyfileobj(part, out)
+            os.remove(part_path)
+
+
+def audit_codes(directory_to_check, output_dir, workers=None, memory_limit_mb=512, merge=False, progress_callback=None,
+                compression=None):
+    """
+    Checks every code CSV in 'directory_to_check' for codes issued more than once,
+    without ever loading the whole corpus into memory.
+
+    Codes are hash-partitioned into bucket spill files on disk (phase 1, files split
+    across worker processes), then each bucket is checked on its own (phase 2, buckets
+    split across worker processes). The number of buckets is chosen so that the
+    buckets being processed at the same time fit in 'memory_limit_mb'; spill lines
+    are buffered within the same budget, so each worker keeps only one spill file
+    open at a time regardless of the number of buckets.
+
+    Writes 'duplicates_report.csv' (code, occurrences, source files) to 'output_dir'
+    and, if 'merge' is True, one deduplicated '<PREFIX>_merged.csv' per prefix under
+    'output_dir/merged' (gzip/zstd compressed if 'compression' is given).
+
+    Returns:
+        dict: files_scanned, codes_scanned, unique_codes, duplicate_codes, report_path, merged_files.
+    """
+    workers = workers or os.cpu_count() or 1
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = output_dir / "_audit_work"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir(parents=True)
+
+    code_files = list(iter_code_files(directory_to_check))
+    if not code_files:
+        raise ValueError(f"Không tìm thấy file CSV nào trong thư mục '{directory_to_check}'.")
+    file_names = [p.name for p in code_files]
+    file_prefixes = [file_prefix(p) for p in code_files]
+
+    total_bytes = sum(p.stat().st_size for p in code_files)
+    uncompressed_bytes = sum(p.stat().st_size * (_COMPRESSION_RATIO_ESTIMATE if split_compression_suffix(p)[1] else 1)
+                             for p in code_files)
+    estimated_codes = uncompressed_bytes / _BYTES_PER_CODE_ON_DISK
+    budget_per_worker = memory_limit_mb * 1024 * 1024 / workers
+    num_buckets = max(workers, math.ceil(estimated_codes * _BYTES_PER_CODE_IN_MEMORY / budget_per_worker))
+    buffer_lines = max(10000, int(budget_per_worker // _BYTES_PER_BUFFERED_LINE))
+
+    if progress_callback:
+        progress_callback(0.0, f"Phân vùng {len(code_files)} file ({total_bytes / 1024 / 1024:.1f} MB) vào {num_buckets} bucket...")
+
+    # Chia file cho các worker theo kiểu round-robin để cân bằng
+    file_groups = [[] for _ in range(workers)]
+    for file_idx, filepath in enumerate(code_files):
+        file_groups[file_idx % workers].append((file_idx, filepath))
+
+    # 'spawn': tác vụ kiểm tra chạy trong luồng của job runner bên trong server Streamlit,
+    # fork một tiến trình đa luồng có thể làm treo các worker
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        codes_scanned = sum(executor.map(
+            _partition_files, range(workers), file_groups, [num_buckets] * workers, [work_dir] * workers,
+            [buffer_lines] * workers
+        ))
+
+        if progress_callback:
+            progress_callback(0.5, f"Đã phân vùng {codes_scanned} mã. Đang kiểm tra trùng lặp theo từng bucket...")
+
+        merge_dir = work_dir / "merged_parts" if merge else None
+        unique_codes = 0
+        duplicate_codes = 0
+        bucket_results = executor.map(
+            _audit_bucket, range(num_buckets), [work_dir] * num_buckets, [file_names] * num_buckets,
+            [file_prefixes] * num_buckets, [merge_dir] * num_buckets
+        )
+        for bucket_idx, (bucket_unique, bucket_duplicates) in enumerate(bucket_results, start=1):
+            unique_codes += bucket_unique
+            duplicate_codes += bucket_duplicates
+            if progress_callback:
+                progress_callback(0.5 + 0.4 * bucket_idx / num_buckets, f"Đã kiểm tra {bucket_idx} / {num_buckets} bucket.")
+
+    report_path = output_dir / "duplicates_report.csv"
+    _concat_files(sorted(work_dir.glob("duplicates_b*.csv")), report_path, header="code,occurrences,source_files")
+
+    merged_files = []
+    if merge:
+        merged_output_dir = output_dir / "merged"
+        merged_output_dir.mkdir(exist_ok=True)
+        for prefix_dir in sorted(p for p in merge_dir.iterdir() if p.is_dir()):
+            merged_path = merged_output_dir / with_compression_suffix(f"{prefix_dir.name}_merged.csv", compression)
+            _concat_files(sorted(prefix_dir.glob("b*.part")), merged_path, header="code")
+            merged_files.append(merged_path)
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if progress_callback:
+        progress_callback(1.0, f"Hoàn tất: {codes_scanned} mã, {duplicate_codes} mã bị trùng.")
+
+    return {
+        "files_scanned": len(code_files),
+        "codes_scanned": codes_scanned,
+        "unique_codes": unique_codes,
+        "duplicate_codes": duplicate_codes,
+        "report_path": report_path,
+        "merged_files": merged_files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra mã trùng lặp trong toàn bộ các file CSV mã đã phát hành.")
+    parser.add_argument("directory", help="Thư mục chứa các file CSV mã (giống thư mục dùng cho load_existing_codes).")
+    parser.add_argument("--output", default="audit_output", help="Thư mục ghi báo cáo và file gộp.")
+    parser.add_argument("--workers", type=int, default=None, help="Số tiến trình song song (mặc định: số CPU).")
+    parser.add_argument("--memory-mb", type=int, default=512, help="Giới hạn RAM tổng cho các bucket đang xử lý.")
+    parser.add_argument("--merge", action="store_true", help="Ghi thêm file gộp đã loại trùng cho mỗi tiền tố.")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None, help="Nén các file gộp.")
+    args = parser.parse_args()
+
+    result = audit_codes(args.directory, args.output, workers=args.workers, memory_limit_mb=args.memory_mb,
+                         merge=args.merge, progress_callback=lambda p, s: print(s), compression=args.compression)
+    print(f"Đã quét {result['files_scanned']} file, {result['codes_scanned']} mã, "
+          f"{result['duplicate_codes']} mã bị trùng. Báo cáo: {result['report_path']}")
+    for merged_path in result["merged_files"]:
+        print(f"  File gộp: {merged_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,19 @@ import random
 import string
 import csv
 import os
+import json
+import sqlite3
+from contextlib import closing
 import pandas as pd # Cần Pandas nếu hàm nào đó dùng nó (ví dụ: tạo DataFrame)
 from pathlib import Path
 
+from .compression import open_text, data_extension, with_compression_suffix
+
 def load_existing_codes(directory_to_check, prefix_to_match):
     """
     Loads all existing codes from CSV files in the specified directory
-    that match the given prefix.
+    that match the given prefix. Compressed files ('.csv.gz', '.csv.zst') are
+    read as a stream.
     """
     existing_codes = set()
 
@@ -20,10 +26,10 @@ def load_existing_codes(directory_to_check, prefix_to_match):
         return existing_codes
 
     for filename in os.listdir(directory_to_check):
-        if filename.endswith(".csv") and filename.upper().startswith(prefix_to_match.upper()):
+        if data_extension(filename) == ".csv" and filename.upper().startswith(prefix_to_match.upper()):
             filepath = os.path.join(directory_to_check, filename)
             try:
-                with open(filepath, mode='r', newline='', encoding='utf-8') as file:
+                with open_text(filepath) as file:
                     reader = csv.reader(file)
                     header = next(reader, None) # Skip header if exists
                     for row in reader:
@@ -71,12 +77,13 @@ def generate_random_code(prefix, num_codes, existing_codes_set, progress_callbac
 
     return [[code] for code in list(generated_codes_current_run)]
 
-def get_unique_filename(prefix, output_dir):
+def get_unique_filename(prefix, output_dir, compression=None):
     """
     Generates a unique CSV filename based on the prefix within the specified output_dir.
     If 'prefix.csv' exists, it tries 'prefix_1.csv', 'prefix_2.csv', etc.
+    With compression ('gzip'/'zstd') the names end in '.csv.gz' / '.csv.zst'.
     """
-    base_filename = f"{prefix}.csv"
+    base_filename = with_compression_suffix(f"{prefix}.csv", compression)
     counter = 0
     filename = base_filename
 
@@ -84,8 +91,194 @@ def get_unique_filename(prefix, output_dir):
 
     while full_path.exists():
         counter += 1
-        filename = f"{prefix}_{counter}.csv"
+        filename = with_compression_suffix(f"{prefix}_{counter}.csv", compression)
         full_path = Path(output_dir) / filename
     return full_path
 
+def write_codes_csv(output_file_path, codes_to_write):
+    """
+    Writes generated codes (rows as returned by generate_random_code) to a CSV file
+    with a single 'code' header, compressed if the path ends in '.gz' / '.zst'.
+    """
+    with open_text(output_file_path, "w") as file:
+        writer = csv.writer(file)
+        writer.writerow(["code"])
+        writer.writerows(codes_to_write)
+    return output_file_path
+
+# Số mã mỗi file part khi tạo theo lô (generate_codes_chunked)
+DEFAULT_CHUNK_SIZE = 1_000_000
+# Số mã ứng viên kiểm tra với chỉ mục của đơn hàng mỗi lần
+_INDEX_BATCH_SIZE = 50_000
+
+def _write_checkpoint(checkpoint_path, checkpoint):
+    # Ghi ra file tạm rồi os.replace để checkpoint không bao giờ bị ghi dở
+    tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, checkpoint_path)
+
+def _iter_codes_csv(filepath):
+    with open_text(filepath) as file:
+        reader = csv.reader(file)
+        next(reader, None) # Skip header
+        for row in reader:
+            if row:
+                yield row[0]
+
+def _open_order_index(index_path):
+    """
+    On-disk index of the codes already written for one order (code -> part number),
+    so uniqueness within the order is checked without keeping every code in memory.
+    """
+    conn = sqlite3.connect(index_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS codes (code TEXT PRIMARY KEY, part INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute("CREATE TEMP TABLE candidates (code TEXT PRIMARY KEY) WITHOUT ROWID")
+    return conn
+
+def _insert_order_codes(conn, codes, part_number):
+    batch = []
+    for code in codes:
+        batch.append((code, part_number))
+        if len(batch) >= _INDEX_BATCH_SIZE:
+            conn.executemany("INSERT OR IGNORE INTO codes (code, part) VALUES (?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT OR IGNORE INTO codes (code, part) VALUES (?, ?)", batch)
+
+def _sync_order_index(conn, order_dir, parts):
+    """Makes the order index hold exactly the codes of the completed parts."""
+    # Mã của part bị bỏ dở (ghi vào chỉ mục trước khi checkpoint được cập nhật)
+    conn.execute("DELETE FROM codes WHERE part > ?", (len(parts),))
+    indexed = conn.execute("SELECT COUNT(*) FROM codes").fetchone()[0]
+    if indexed != sum(part["count"] for part in parts):
+        # Chỉ mục bị mất hoặc không khớp checkpoint: dựng lại từ các part đã hoàn tất
+        conn.execute("DELETE FROM codes")
+        for part_number, part in enumerate(parts, start=1):
+            _insert_order_codes(conn, _iter_codes_csv(order_dir / part["file"]), part_number)
+    conn.commit()
+
+def _codes_in_order_index(conn, candidates):
+    conn.execute("DELETE FROM candidates")
+    # Chèn theo thứ tự khóa nhanh hơn nhiều so với chèn ngẫu nhiên vào B-tree
+    conn.executemany("INSERT INTO candidates (code) VALUES (?)", ((code,) for code in sorted(candidates)))
+    return {row[0] for row in conn.execute("SELECT c.code FROM candidates c JOIN codes o ON o.code = c.code")}
+
+def _remove_order_index(index_path):
+    for path in (index_path, Path(f"{index_path}-wal"), Path(f"{index_path}-shm")):
+        path.unlink(missing_ok=True)
+
+def generate_codes_chunked(prefix, num_codes, existing_codes_set, order_dir, chunk_size=DEFAULT_CHUNK_SIZE,
+                           order_name=None, progress_callback=None, compression=None):
+    """
+    Generates unique codes like generate_random_code, but writes them to disk in
+    fixed-size part files ('<order_name>_part00001.csv', ...) as they are produced
+    instead of returning them all at the end.
+
+    Progress is checkpointed in '<order_name>.checkpoint.json' inside 'order_dir'
+    after every completed part. Calling this again with the same arguments resumes
+    the order: codes from completed parts are excluded from generation, and a part
+    left half-written by a crash is discarded and regenerated, so no code is ever
+    duplicated or lost. Parts are gzip/zstd compressed if 'compression' is given.
+
+    Codes already written for the order are tracked in an SQLite index
+    ('<order_name>.index.sqlite3', removed once the order is complete), so memory
+    use is bounded by 'chunk_size' rather than by the size of the order.
+
+    Returns:
+        tuple: (list of part file paths, total number of codes written).
+    """
+    if not (3 <= len(prefix) <= 8):
+        raise ValueError("Prefix must be between 3 and 8 characters long.")
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be greater than 0.")
+
+    order_dir = Path(order_dir)
+    order_dir.mkdir(parents=True, exist_ok=True)
+    order_name = order_name or prefix
+    checkpoint_path = order_dir / f"{order_name}.checkpoint.json"
+    index_path = order_dir / f"{order_name}.index.sqlite3"
+
+    if checkpoint_path.exists():
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint["prefix"] != prefix or checkpoint["num_codes"] != num_codes:
+            raise ValueError(f"Checkpoint '{checkpoint_path.name}' belongs to a different order "
+                             f"(prefix '{checkpoint['prefix']}', {checkpoint['num_codes']} codes).")
+    else:
+        checkpoint = {"prefix": prefix, "num_codes": num_codes, "chunk_size": chunk_size, "parts": [], "codes_written": 0}
+        _write_checkpoint(checkpoint_path, checkpoint)
+
+    # Keep the chunk size the order was started with so part boundaries stay stable across resumes
+    chunk_size = checkpoint["chunk_size"]
+    completed_parts = {part["file"] for part in checkpoint["parts"]}
+    if checkpoint["codes_written"] >= num_codes:
+        _remove_order_index(index_path)
+        return [order_dir / part["file"] for part in checkpoint["parts"]], checkpoint["codes_written"]
+
+    # Discard parts written after the last checkpoint (the process died before recording them)
+    for stale in order_dir.glob(f"{order_name}_part*.csv*"):
+        if stale.name not in completed_parts:
+            os.remove(stale)
+
+    random_part_length = 16 - len(prefix)
+    alphabet = string.ascii_uppercase + string.digits
+    codes_written = checkpoint["codes_written"]
+    remaining = num_codes - codes_written
+    attempts = 0
+    max_attempts = remaining * 10
+
+    with closing(_open_order_index(index_path)) as conn:
+        _sync_order_index(conn, order_dir, checkpoint["parts"])
+
+        while codes_written < num_codes and attempts < max_attempts:
+            chunk_target = min(chunk_size, num_codes - codes_written)
+            chunk = {} # Giữ thứ tự tạo, kiểm tra trùng trong part
+            while len(chunk) < chunk_target and attempts < max_attempts:
+                candidates = set()
+                while len(candidates) < min(_INDEX_BATCH_SIZE, chunk_target - len(chunk)) and attempts < max_attempts:
+                    full_code = prefix + ''.join(random.choices(alphabet, k=random_part_length))
+                    attempts += 1
+                    if full_code not in existing_codes_set and full_code not in chunk:
+                        candidates.add(full_code)
+                already_written = _codes_in_order_index(conn, candidates)
+                chunk.update((code, None) for code in candidates if code not in already_written)
+                if progress_callback:
+                    progress_callback(min(1.0, (codes_written + len(chunk)) / num_codes),
+                                      f"Generating codes: {codes_written + len(chunk)} / {num_codes} (part {len(checkpoint['parts']) + 1})")
+
+            if not chunk:
+                break
+
+            part_number = len(checkpoint["parts"]) + 1
+            part_name = with_compression_suffix(f"{order_name}_part{part_number:05d}.csv", compression)
+            tmp_path = order_dir / (part_name + ".tmp")
+            with open_text(tmp_path, "w", compression=compression) as file:
+                writer = csv.writer(file)
+                writer.writerow(["code"])
+                writer.writerows([code] for code in chunk)
+            os.replace(tmp_path, order_dir / part_name)
+
+            # Chỉ mục được ghi trước checkpoint; nếu dừng giữa hai bước, _sync_order_index bỏ các mã thừa
+            _insert_order_codes(conn, sorted(chunk), part_number)
+            conn.commit()
+
+            codes_written += len(chunk)
+            checkpoint["parts"].append({"file": part_name, "count": len(chunk)})
+            checkpoint["codes_written"] = codes_written
+            _write_checkpoint(checkpoint_path, checkpoint)
+
+            if progress_callback:
+                progress_callback(min(1.0, codes_written / num_codes), f"Generating codes: {codes_written} / {num_codes} (part {len(checkpoint['parts'])} saved)")
+
+    if codes_written >= num_codes:
+        _remove_order_index(index_path)
+    else:
+        print(f"Warning: Could only generate {codes_written} unique codes for prefix '{prefix}' after {max_attempts} attempts. "
+              "This might indicate a high density of existing codes or too many requested codes for the available unique space.")
+
+    return [order_dir / part["file"] for part in checkpoint["parts"]], codes_written
+
 # Bạn có thể thêm các hàm khác liên quan đến việc tạo mã ở đây
\ No newline at end of file
@@ -0,0 +1,233 @@
+# scripts/code_index.py
+import argparse
+import csv
+import io
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from .code_audit import iter_code_files, iter_codes_in_file
+from .compression import open_input_stream, data_extension
+
+# Số mã chèn vào SQLite mỗi lần executemany
+_INSERT_BATCH_SIZE = 50000
+# Tăng khi cấu trúc bảng thay đổi: chỉ mục cũ sẽ được dựng lại
+_SCHEMA_VERSION = "2"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS codes (
+    code TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (code, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS codes_file_id ON codes (file_id);
+"""
+
+
+def _connect(index_path):
+    conn = sqlite3.connect(index_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def _schema_version(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    return row[0] if row else None
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_code_index(directory_to_check, index_path, progress_callback=None):
+    """
+    Builds or incrementally updates a SQLite index (code -> source file) over the
+    code CSVs in 'directory_to_check'.
+
+    Only files that are new or whose size/modification time changed are re-read;
+    codes of deleted files are dropped. If the index was built for another
+    directory (or by an older version) it is rebuilt from scratch. A code found in
+    several files is indexed once per file, so it stays known as long as any of
+    them remains.
+
+    Returns:
+        dict: files_indexed (re-read this run), files_total, codes_total.
+    """
+    index_path = Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    directory_key = os.path.abspath(directory_to_check)
+
+    with closing(_connect(index_path)) as conn:
+        if _schema_version(conn) != _SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS codes")
+            conn.execute("DROP TABLE IF EXISTS files")
+            conn.execute("DELETE FROM meta")
+        conn.executescript(_SCHEMA)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'directory'").fetchone()
+        if row and row[0] != directory_key:
+            conn.execute("DELETE FROM codes")
+            conn.execute("DELETE FROM files")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('directory', ?)", (directory_key,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (_SCHEMA_VERSION,))
+        conn.commit()
+
+        indexed_files = {name: (file_id, size, mtime) for file_id, name, size, mtime
+                         in conn.execute("SELECT id, name, size, mtime FROM files")}
+        code_files = list(iter_code_files(directory_to_check))
+        current_names = {p.name for p in code_files}
+
+        for name, (file_id, _, _) in indexed_files.items():
+            if name not in current_names:
+                conn.execute("DELETE FROM codes WHERE file_id = ?", (file_id,))
+                conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        conn.commit()
+
+        files_indexed = 0
+        for file_number, filepath in enumerate(code_files, start=1):
+            stat = filepath.stat()
+            known = indexed_files.get(filepath.name)
+            if known and known[1] == stat.st_size and known[2] == stat.st_mtime:
+                continue
+
+            if progress_callback:
+                progress_callback(file_number / len(code_files), f"Đang lập chỉ mục: {filepath.name} ({file_number}/{len(code_files)})")
+
+            try:
+                if known:
+                    conn.execute("DELETE FROM codes WHERE file_id = ?", (known[0],))
+                    conn.execute("DELETE FROM files WHERE id = ?", (known[0],))
+                file_id = conn.execute(
+                    "INSERT INTO files (name, size, mtime) VALUES (?, ?, ?)",
+                    (filepath.name, stat.st_size, stat.st_mtime),
+                ).lastrowid
+                for batch in _batched(iter_codes_in_file(filepath), _INSERT_BATCH_SIZE):
+                    conn.executemany("INSERT OR IGNORE INTO codes (code, file_id) VALUES (?, ?)",
+                                     [(code, file_id) for code in batch])
+                conn.commit()
+                files_indexed += 1
+            except Exception as e:
+                conn.rollback()
+                print(f"Warning: Could not index codes from '{filepath.name}': {e}")
+
+        codes_total = conn.execute("SELECT COUNT(DISTINCT code) FROM codes").fetchone()[0]
+
+    if progress_callback:
+        progress_callback(1.0, f"Chỉ mục đã cập nhật: {len(code_files)} file, {codes_total} mã.")
+
+    return {"files_indexed": files_indexed, "files_total": len(code_files), "codes_total": codes_total}
+
+
+def lookup_codes(codes, index_path):
+    """
+    Looks up many codes at once against a prebuilt index.
+
+    The codes are loaded into a temporary table and joined with the index in a
+    single query, which is far faster than one query per code.
+
+    Returns:
+        list of (code, found, source_files) tuples, in input order. source_files
+        lists every indexed file containing the code (empty for codes that were
+        never issued).
+    """
+    if not Path(index_path).exists():
+        raise ValueError("Chưa có chỉ mục mã. Vui lòng cập nhật chỉ mục trước khi tra cứu.")
+
+    with closing(_connect(index_path)) as conn:
+        if _schema_version(conn) != _SCHEMA_VERSION:
+            raise ValueError("Chỉ mục mã được tạo bởi phiên bản cũ. Vui lòng cập nhật chỉ mục trước khi tra cứu.")
+        conn.execute("CREATE TEMP TABLE query_codes (pos INTEGER PRIMARY KEY, code TEXT NOT NULL)")
+        for batch in _batched(enumerate(codes), _INSERT_BATCH_SIZE):
+            conn.executemany("INSERT INTO query_codes (pos, code) VALUES (?, ?)", batch)
+        rows = conn.execute(
+            "SELECT q.pos, q.code, f.name FROM query_codes q "
+            "LEFT JOIN codes c ON c.code = q.code "
+            "LEFT JOIN files f ON f.id = c.file_id "
+            "ORDER BY q.pos, f.name"
+        )
+        results = []
+        last_pos = None
+        # Mỗi mã cần tra có một dòng (không tìm thấy) hoặc một dòng cho mỗi file chứa mã
+        for pos, code, source_file in rows:
+            if pos != last_pos:
+                results.append((code, source_file is not None, []))
+                last_pos = pos
+            if source_file is not None:
+                results[-1][2].append(source_file)
+    return results
+
+
+def read_codes_to_verify(uploaded_file_stream, filename):
+    """
+    Reads the list of codes to verify from an uploaded TXT (one code per line) or
+    CSV (first column; a 'code' header is skipped), optionally gzip/zstd compressed.
+    Codes are stripped and uppercased.
+    """
+    text_stream = io.TextIOWrapper(open_input_stream(uploaded_file_stream, filename), encoding="utf-8-sig", newline="")
+    try:
+        if data_extension(filename) == ".csv":
+            values = (row[0] for row in csv.reader(text_stream) if row)
+        else:
+            values = (line for line in text_stream)
+        codes = [value.strip().upper() for value in values if value.strip()]
+    finally:
+        text_stream.detach()
+    if codes and codes[0] == "CODE":
+        codes = codes[1:]
+    return codes
+
+
+def write_lookup_results(results, output_path):
+    """Writes lookup results as CSV (code, found, source_files) and returns the found count."""
+    found_count = 0
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["code", "found", "source_files"])
+        for code, found, source_files in results:
+            found_count += found
+            writer.writerow([code, "yes" if found else "no", ";".join(source_files)])
+    return found_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lập chỉ mục và tra cứu hàng loạt các mã đã phát hành.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Tạo/cập nhật chỉ mục từ thư mục file CSV mã.")
+    build_parser.add_argument("directory")
+    build_parser.add_argument("--index", default="code_index.sqlite3")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Tra cứu danh sách mã (TXT hoặc CSV).")
+    lookup_parser.add_argument("codes_file")
+    lookup_parser.add_argument("--index", default="code_index.sqlite3")
+    lookup_parser.add_argument("--output", default="lookup_results.csv")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        result = build_code_index(args.directory, args.index, progress_callback=lambda p, s: print(s))
+        print(f"Đã lập chỉ mục lại {result['files_indexed']} / {result['files_total']} file, tổng {result['codes_total']} mã.")
+    else:
+        with open(args.codes_file, "rb") as f:
+            codes = read_codes_to_verify(f, args.codes_file)
+        found_count = write_lookup_results(lookup_codes(codes, args.index), args.output)
+        print(f"Tìm thấy {found_count} / {len(codes)} mã. Kết quả: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
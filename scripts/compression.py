@@ -0,0 +1,109 @@
+# scripts/compression.py
+import gzip
+from pathlib import Path
+
+# zstd là tùy chọn: chỉ cần khi thực sự đọc/ghi file .zst
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def split_compression_suffix(filename):
+    """
+    Splits a trailing compression extension off a file name.
+    'codes.csv.gz' -> ('codes.csv', 'gzip'), 'codes.csv' -> ('codes.csv', None).
+    """
+    name = Path(filename).name
+    suffix = Path(name).suffix.lower()
+    if suffix in COMPRESSION_SUFFIXES:
+        return name[:-len(suffix)], COMPRESSION_SUFFIXES[suffix]
+    return name, None
+
+
+def data_extension(filename):
+    """Extension of the data inside a possibly compressed file: 'a.CSV.gz' -> '.csv'."""
+    return Path(split_compression_suffix(filename)[0]).suffix.lower()
+
+
+def with_compression_suffix(filename, compression):
+    """Appends the extension for 'compression' ('gzip'/'zstd'/None) to a file name."""
+    if not compression:
+        return filename
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Kiểu nén '{compression}' không được hỗ trợ. Chỉ hỗ trợ gzip và zstd.")
+    return f"{filename}{COMPRESSION_EXTENSIONS[compression]}"
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ValueError("Cần cài đặt thư viện 'zstandard' để đọc/ghi file .zst (pip install zstandard).")
+
+
+def detect_compression(binary_stream, filename=None):
+    """
+    Detects gzip/zstd from the magic bytes of a seekable binary stream, falling back
+    to the file extension. The stream position is left unchanged.
+    """
+    position = binary_stream.tell()
+    head = binary_stream.read(4)
+    binary_stream.seek(position)
+    if head.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(_ZSTD_MAGIC):
+        return "zstd"
+    if filename:
+        return split_compression_suffix(filename)[1]
+    return None
+
+
+def decompress_stream(binary_stream, compression):
+    """Wraps a binary stream so reads return decompressed bytes (streaming, no full copy)."""
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=binary_stream, mode="rb")
+    if compression == "zstd":
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(binary_stream, closefd=False)
+    return binary_stream
+
+
+def open_input_stream(binary_stream, filename=None):
+    """
+    Rewinds an uploaded/opened binary stream and returns a stream of its decompressed
+    content. Call again to read the input from the start once more (decompressing
+    readers cannot always seek backwards).
+    """
+    binary_stream.seek(0)
+    return decompress_stream(binary_stream, detect_compression(binary_stream, filename))
+
+
+def open_text(path, mode="r", compression="infer", encoding="utf-8", newline=""):
+    """
+    Opens a file in text mode, transparently (de)compressing gzip/zstd.
+
+    With compression='infer', reading detects the format from magic bytes and
+    writing uses the file extension ('.gz' / '.zst').
+    """
+    path = Path(path)
+    if mode not in ("r", "w", "a"):
+        raise ValueError(f"Chế độ mở file '{mode}' không được hỗ trợ.")
+
+    if compression == "infer":
+        if mode == "r":
+            with open(path, "rb") as raw:
+                compression = detect_compression(raw, path.name)
+        else:
+            compression = split_compression_suffix(path.name)[1]
+
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding=encoding, newline=newline)
+    if compression == "zstd":
+        _require_zstandard()
+        return zstandard.open(path, mode + "t", encoding=encoding, newline=newline)
+    return open(path, mode, encoding=encoding, newline=newline)
@@ -4,16 +4,32 @@ import os
 import pandas as pd # Có thể cần nếu bạn muốn trả về DataFrame
 
 # Import các hàm từ code_generator nếu cần dùng chúng
-from .code_generator import load_existing_codes, generate_random_code, get_unique_filename
+from .code_generator import load_existing_codes, generate_random_code, get_unique_filename, write_codes_csv, generate_codes_chunked
+from .memory_planner import plan_execution, stream_size, REJECT
 
-def process_excel_for_codes(uploaded_excel_file, directory_to_check_codes, output_dir, progress_callback_excel=None):
+def process_excel_for_codes(uploaded_excel_file, directory_to_check_codes, output_dir, progress_callback_excel=None,
+                            chunk_size=None, compression=None):
     """
     Processes an Excel file to generate codes based on prefixes and quantities.
-    Returns a list of paths to generated files.
+    Returns a list of paths to generated files (gzip/zstd compressed if
+    'compression' is given).
+
+    If 'chunk_size' is given, each row is generated with generate_codes_chunked
+    (part files + checkpoint named after the prefix and row), so re-running the same
+    file into the same output_dir resumes instead of starting over.
     """
     generated_file_paths = []
     rows_processed = 0
 
+    # openpyxl nạp toàn bộ workbook vào bộ nhớ: từ chối file quá lớn thay vì làm sập server
+    if hasattr(uploaded_excel_file, "read"):
+        excel_size, excel_name = stream_size(uploaded_excel_file), getattr(uploaded_excel_file, "name", "input.xlsx")
+    else:
+        excel_size, excel_name = os.path.getsize(uploaded_excel_file), os.path.basename(uploaded_excel_file)
+    plan = plan_execution(excel_size, excel_name, streaming_supported=False)
+    if plan.mode == REJECT:
+        raise ValueError(plan.reason)
+
     try:
         workbook = openpyxl.load_workbook(uploaded_excel_file)
         sheet = workbook.active
@@ -60,6 +76,24 @@ def process_excel_for_codes(uploaded_excel_file, directory_to_check_codes, outpu
         # Use load_existing_codes from the same package
         existing_codes_set = load_existing_codes(directory_to_check_codes, prefix)
 
+        if chunk_size:
+            try:
+                part_paths, codes_written = generate_codes_chunked(
+                    prefix, num_codes, existing_codes_set, output_dir, chunk_size=chunk_size,
+                    order_name=f"{prefix}_row{row_idx}",
+                    progress_callback=lambda p, s: print(f"  Internal progress for {prefix}: {s}"),
+                    compression=compression)
+                if codes_written:
+                    generated_file_paths.extend(part_paths)
+                    rows_processed += 1
+                else:
+                    print(f"No new unique codes could be generated for prefix '{prefix}'. Skipping this row.")
+            except ValueError as e:
+                print(f"Error in row {row_idx} for prefix '{prefix}': {e}. Skipping this row.")
+            except Exception as e:
+                print(f"An unexpected error occurred while processing row {row_idx} for prefix '{prefix}': {e}. Skipping this row.")
+            continue
+
         try:
             # Pass a dummy callback or a real Streamlit callback for generate_random_code
             # Here we use a lambda that just prints, as its own progress is for its internal loop
@@ -67,12 +101,9 @@ def process_excel_for_codes(uploaded_excel_file, directory_to_check_codes, outpu
                                                   progress_callback=lambda p, s: print(f"  Internal progress for {prefix}: {s}"))
 
             if codes_to_write:
-                output_file_path = get_unique_filename(prefix, output_dir)
+                output_file_path = get_unique_filename(prefix, output_dir, compression)
 
-                with open(output_file_path, mode="w", newline="", encoding="utf-8") as file:
-                    writer = csv.writer(file)
-                    writer.writerow(["code"])
-                    writer.writerows(codes_to_write)
+                write_codes_csv(output_file_path, codes_to_write)
 
                 generated_file_paths.append(output_file_path)
                 rows_processed += 1
@@ -3,7 +3,11 @@ import pandas as pd
 import os
 from pathlib import Path
 
-def convert_file(uploaded_file, target_format, output_dir):
+from .compression import open_text, open_input_stream, split_compression_suffix, with_compression_suffix
+from .streaming_io import convert_streaming
+from .memory_planner import plan_execution, stream_size, streaming_supported_for, STREAMING, REJECT
+
+def convert_file(uploaded_file, target_format, output_dir, compression=None, row_filters=None, columns=None):
     """
     Chuyển đổi file được tải lên sang định dạng mục tiêu (CSV, Excel, TXT).
 
@@ -11,6 +15,15 @@ def convert_file(uploaded_file, target_format, output_dir):
         uploaded_file: Đối tượng file được tải lên từ Streamlit (File-like object).
         target_format (str): Định dạng đích ('csv', 'excel', 'txt').
         output_dir (Path): Thư mục để lưu file đầu ra.
+        compression (str): Nén file đầu ra CSV/TXT bằng 'gzip' hoặc 'zstd' (tùy chọn).
+                           File đầu vào nén (.gz, .zst) được tự động giải nén khi đọc.
+        row_filters (list): Điều kiện lọc hàng (xem scripts/row_filter.py), tùy chọn.
+        columns (list): Các cột cần giữ, tùy chọn. Khi có lọc hoặc chọn cột, file được đọc
+                        theo từng chunk và chỉ các hàng khớp được ghi ra; DataFrame trả về
+                        khi đó chỉ là bản xem trước vài dòng đầu.
+                        File CSV/Excel quá lớn so với giới hạn bộ nhớ (scripts/memory_planner.py)
+                        cũng được xử lý theo luồng với kết quả giống hệt; file TXT quá lớn hoặc
+                        file không thể xử lý trong giới hạn bị từ chối.
 
     Returns:
         tuple: (Đường dẫn file đầu ra nếu thành công, DataFrame đã đọc).
@@ -18,26 +31,49 @@ def convert_file(uploaded_file, target_format, output_dir):
     """
     try:
         # Bước 1: Đọc file đầu vào vào DataFrame
-        file_extension = Path(uploaded_file.name).suffix.lower()
-        base_name = Path(uploaded_file.name).stem
+        data_filename = split_compression_suffix(uploaded_file.name)[0]
+        file_extension = Path(data_filename).suffix.lower()
+        base_name = Path(data_filename).stem
+
+        filtered = bool(row_filters or columns)
+        plan = plan_execution(stream_size(uploaded_file), uploaded_file.name,
+                              streaming_supported_for(uploaded_file.name, "convert", filtered))
+        if plan.mode == REJECT:
+            raise ValueError(plan.reason)
+
+        if filtered or plan.mode == STREAMING:
+            if plan.mode == STREAMING:
+                print(plan.reason)
+            if file_extension not in ['.csv', '.xlsx', '.xls', '.txt']:
+                raise ValueError("Định dạng file đầu vào không được hỗ trợ. Vui lòng tải lên CSV, Excel hoặc TXT.")
+            if target_format not in ['csv', 'excel', 'txt']:
+                raise ValueError("Định dạng file đầu ra không được hỗ trợ. Vui lòng chọn CSV, Excel hoặc TXT.")
+            output_filename = f"{base_name}_converted.{target_format}"
+            if target_format in ['csv', 'txt']:
+                output_filename = with_compression_suffix(output_filename, compression)
+            output_path = output_dir / output_filename
+            _, preview_df = convert_streaming(
+                uploaded_file, uploaded_file.name, output_path, 'xlsx' if target_format == 'excel' else target_format,
+                file_extension, row_filters, columns
+            )
+            return output_path, preview_df
 
         df = None
         if file_extension == '.csv':
-            df = pd.read_csv(uploaded_file)
+            df = pd.read_csv(open_input_stream(uploaded_file, uploaded_file.name))
         elif file_extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(uploaded_file)
+            df = pd.read_excel(open_input_stream(uploaded_file, uploaded_file.name))
         elif file_extension == '.txt':
             # Đối với TXT, đọc dưới dạng CSV với dấu phân cách có thể tùy chỉnh
             # Mặc định thử đọc với tab, sau đó là space.
             # Trong ứng dụng thực tế, bạn có thể muốn hỏi người dùng dấu phân cách.
+            # open_input_stream tua lại file từ đầu (và giải nén nếu cần) cho mỗi lần thử
             try:
-                df = pd.read_csv(uploaded_file, sep='\t', header=None) # Thử tab-separated
+                df = pd.read_csv(open_input_stream(uploaded_file, uploaded_file.name), sep='\t', header=None) # Thử tab-separated
             except pd.errors.ParserError:
-                uploaded_file.seek(0) # Reset con trỏ file
-                df = pd.read_csv(uploaded_file, sep=' ', header=None) # Thử space-separated
+                df = pd.read_csv(open_input_stream(uploaded_file, uploaded_file.name), sep=' ', header=None) # Thử space-separated
             except Exception: # Nếu vẫn lỗi, thử đọc dưới dạng 1 cột
-                uploaded_file.seek(0)
-                df = pd.DataFrame([line.strip() for line in uploaded_file.readlines()], columns=['Content'])
+                df = pd.DataFrame([line.strip() for line in open_input_stream(uploaded_file, uploaded_file.name)], columns=['Content'])
         else:
             raise ValueError("Định dạng file đầu vào không được hỗ trợ. Vui lòng tải lên CSV, Excel hoặc TXT.")
 
@@ -46,15 +82,19 @@ def convert_file(uploaded_file, target_format, output_dir):
 
         # Bước 2: Chuyển đổi và lưu file theo định dạng đích
         output_filename = f"{base_name}_converted.{target_format}"
+        if target_format in ['csv', 'txt']:
+            output_filename = with_compression_suffix(output_filename, compression)
         output_path = output_dir / output_filename
 
         if target_format == 'csv':
-            df.to_csv(output_path, index=False, encoding='utf-8')
+            with open_text(output_path, 'w') as f:
+                df.to_csv(f, index=False)
         elif target_format == 'excel':
             df.to_excel(output_path, index=False, engine='openpyxl')
         elif target_format == 'txt':
             # Đối với TXT, lưu dưới dạng CSV tab-separated hoặc đơn giản là string
-            df.to_csv(output_path, sep='\t', index=False, header=False, encoding='utf-8')
+            with open_text(output_path, 'w') as f:
+                df.to_csv(f, sep='\t', index=False, header=False)
         else:
             raise ValueError("Định dạng file đầu ra không được hỗ trợ. Vui lòng chọn CSV, Excel hoặc TXT.")
 
@@ -0,0 +1,309 @@
+# scripts/job_runner.py
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Số lần ghi tiến trình tối đa mỗi giây cho một job (generate_random_code gọi callback ở mỗi lần thử)
+PROGRESS_WRITE_INTERVAL = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+
+class JobRunner:
+    """
+    Runs generation, conversion and batch jobs on background worker threads so they
+    survive Streamlit reruns and browser disconnects.
+
+    Every job gets its own directory under 'jobs_dir' (inputs + outputs) and a row in a
+    SQLite job table, so the UI can poll status and fetch results from any session.
+    At most 'max_workers' jobs run at the same time; the rest wait in the queue.
+    Jobs left 'queued' or 'running' by a previous process are re-queued on start-up;
+    unless the handler resumes from its own output (chunked generation), the outputs of
+    the interrupted attempt are cleared before the job runs again.
+    """
+
+    def __init__(self, jobs_dir, max_workers=2):
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.jobs_dir / "jobs.sqlite3"
+        self._db_lock = threading.Lock()
+        self._handlers = {}
+        self._resumable = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(_SCHEMA)
+
+        register_default_handlers(self)
+        self._requeue_unfinished_jobs()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql, args=()):
+        with self._db_lock, closing(self._connect()) as conn, conn:
+            conn.execute(sql, args)
+
+    def register_handler(self, kind, handler, resumable=None):
+        """
+        Registers a job handler: handler(params, job_dir, progress_callback) -> dict.
+        The returned dict is stored as the job result; its 'output_files' entry (list of
+        paths) is what the UI offers for download.
+
+        'resumable' is an optional function(params) -> bool telling whether a re-run of
+        an interrupted job continues from the files already in its output directory.
+        """
+        self._handlers[kind] = handler
+        if resumable is not None:
+            self._resumable[kind] = resumable
+
+    def job_dir(self, job_id):
+        return self.jobs_dir / job_id
+
+    def create_job_dir(self):
+        """Creates an empty job directory so callers can stage input files before submitting."""
+        job_id = uuid.uuid4().hex[:12]
+        (self.job_dir(job_id) / "input").mkdir(parents=True, exist_ok=True)
+        (self.job_dir(job_id) / "output").mkdir(parents=True, exist_ok=True)
+        return job_id
+
+    def submit(self, kind, params, job_id=None):
+        """Queues a job and returns its id. 'params' must be JSON serializable."""
+        if kind not in self._handlers:
+            raise ValueError(f"Loại tác vụ '{kind}' không được hỗ trợ.")
+        if job_id is None:
+            job_id = self.create_job_dir()
+
+        self._execute(
+            "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, JOB_QUEUED, json.dumps(params), time.time()),
+        )
+        self._executor.submit(self._run_job, job_id)
+        return job_id
+
+    def get_job(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(self, limit=50):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def delete_job(self, job_id):
+        """Removes a finished job and its files. Queued/running jobs cannot be deleted."""
+        job = self.get_job(job_id)
+        if job is None:
+            return False
+        if job["status"] in (JOB_QUEUED, JOB_RUNNING):
+            raise ValueError("Không thể xóa tác vụ đang chờ hoặc đang chạy.")
+        self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return True
+
+    def _requeue_unfinished_jobs(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_QUEUED, JOB_RUNNING),
+            ).fetchall()
+        for row in rows:
+            self._execute(
+                "UPDATE jobs SET status = ?, progress = 0, message = ? WHERE id = ?",
+                (JOB_QUEUED, "Đã xếp hàng lại sau khi khởi động lại.", row["id"]),
+            )
+            self._executor.submit(self._run_job, row["id"])
+
+    def _run_job(self, job_id):
+        job = self.get_job(job_id)
+        if job is None or job["status"] != JOB_QUEUED:
+            return
+
+        self._execute(
+            "UPDATE jobs SET status = ?, started_at = ?, message = ? WHERE id = ?",
+            (JOB_RUNNING, time.time(), "Đang chạy...", job_id),
+        )
+
+        last_write = [0.0]
+
+        def update_progress(progress, text):
+            now = time.monotonic()
+            if now - last_write[0] < PROGRESS_WRITE_INTERVAL and progress < 1.0:
+                return
+            last_write[0] = now
+            self._execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (float(progress), str(text), job_id))
+
+        try:
+            handler = self._handlers[job["kind"]]
+            job_dir = self.job_dir(job_id)
+            resumable = self._resumable.get(job["kind"])
+            if job["started_at"] is not None and not (resumable and resumable(job["params"])):
+                # Lần chạy trước bị gián đoạn: xóa kết quả dở dang để không lẫn vào kết quả lần này
+                shutil.rmtree(job_dir / "output", ignore_errors=True)
+            (job_dir / "output").mkdir(parents=True, exist_ok=True)
+            result = handler(job["params"], job_dir, update_progress) or {}
+            result["output_files"] = [str(p) for p in result.get("output_files", [])]
+            self._execute(
+                "UPDATE jobs SET status = ?, progress = 1, message = ?, result = ?, finished_at = ? WHERE id = ?",
+                (JOB_DONE, "Hoàn tất.", json.dumps(result), time.time(), job_id),
+            )
+        except Exception as e:
+            print(f"Lỗi khi chạy tác vụ nền '{job_id}': {e}")
+            traceback.print_exc()
+            self._execute(
+                "UPDATE jobs SET status = ?, message = ?, error = ?, finished_at = ? WHERE id = ?",
+                (JOB_FAILED, "Thất bại.", str(e), time.time(), job_id),
+            )
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+# --- Các handler mặc định: dùng lại logic có sẵn trong thư mục scripts ---
+
+def _generate_handler(params, job_dir, progress_callback):
+    from .code_generator import (load_existing_codes, generate_random_code, get_unique_filename, write_codes_csv,
+                                 generate_codes_chunked)
+
+    prefix = params["prefix"]
+    existing_codes_set = load_existing_codes(params["directory_to_check"], prefix)
+    progress_callback(0.0, f"Tìm thấy {len(existing_codes_set)} mã hiện có cho tiền tố '{prefix}'.")
+
+    if params.get("chunk_size"):
+        # Ghi theo lô vào thư mục output của job: nếu job bị xếp hàng lại sau khi khởi động lại,
+        # checkpoint trong thư mục này giúp tiếp tục thay vì tạo lại từ đầu.
+        part_paths, codes_written = generate_codes_chunked(
+            prefix, int(params["num_codes"]), existing_codes_set, job_dir / "output",
+            chunk_size=int(params["chunk_size"]), progress_callback=progress_callback,
+            compression=params.get("compression")
+        )
+        if codes_written == 0:
+            raise ValueError("Không thể tạo thêm mã duy nhất nào dựa trên yêu cầu và các mã hiện có.")
+        return {"output_files": part_paths, "codes_generated": codes_written}
+
+    codes_to_write = generate_random_code(prefix, int(params["num_codes"]), existing_codes_set, progress_callback)
+    if not codes_to_write:
+        raise ValueError("Không thể tạo thêm mã duy nhất nào dựa trên yêu cầu và các mã hiện có.")
+
+    output_file_path = get_unique_filename(prefix, job_dir / "output", params.get("compression"))
+    write_codes_csv(output_file_path, codes_to_write)
+    return {"output_files": [output_file_path], "codes_generated": len(codes_to_write)}
+
+
+def _generate_excel_handler(params, job_dir, progress_callback):
+    from .excel_processor import process_excel_for_codes
+
+    generated_file_paths, rows_processed = process_excel_for_codes(
+        params["input_file"], params["directory_to_check"], job_dir / "output", progress_callback,
+        chunk_size=params.get("chunk_size"), compression=params.get("compression")
+    )
+    return {"output_files": generated_file_paths, "rows_processed": rows_processed}
+
+
+def _convert_handler(params, job_dir, progress_callback):
+    from .file_converter import convert_file
+
+    progress_callback(0.0, f"Đang chuyển đổi '{Path(params['input_file']).name}'...")
+    with open(params["input_file"], "rb") as f:
+        output_path, _ = convert_file(f, params["target_format"], job_dir / "output", params.get("compression"),
+                                      params.get("row_filters"), params.get("columns"))
+    if output_path is None:
+        raise ValueError("Không thể hoàn tất quá trình chuyển đổi. Vui lòng kiểm tra file đầu vào và định dạng.")
+    return {"output_files": [output_path]}
+
+
+def _batch_handler(params, job_dir, progress_callback):
+    from .batch_processor import process_batch_files
+
+    processed_files, zip_path = process_batch_files(
+        [Path(p) for p in params["input_files"]],
+        params["output_format"],
+        params.get("split_configs", {}),
+        job_dir / "output",
+        progress_callback,
+        compression=params.get("compression"),
+        row_filters=params.get("row_filters"),
+        columns=params.get("columns"),
+    )
+    if not processed_files:
+        raise ValueError("Không có file nào được xử lý thành công.")
+    return {"output_files": [zip_path] if zip_path else processed_files}
+
+
+def _audit_handler(params, job_dir, progress_callback):
+    from .code_audit import audit_codes
+
+    result = audit_codes(
+        params["directory_to_check"], job_dir / "output",
+        workers=params.get("workers"), memory_limit_mb=int(params.get("memory_limit_mb", 512)),
+        merge=bool(params.get("merge")), progress_callback=progress_callback
+    )
+    return {
+        "output_files": [result["report_path"]] + result["merged_files"],
+        "files_scanned": result["files_scanned"],
+        "codes_scanned": result["codes_scanned"],
+        "duplicate_codes": result["duplicate_codes"],
+    }
+
+
+def _build_index_handler(params, job_dir, progress_callback):
+    from .code_index import build_code_index
+
+    result = build_code_index(params["directory_to_check"], params["index_path"], progress_callback)
+    return {"output_files": [], **result}
+
+
+def _resumes_from_checkpoint(params):
+    # Tạo mã theo lô tiếp tục từ checkpoint trong thư mục output
+    return bool(params.get("chunk_size"))
+
+
+def register_default_handlers(runner):
+    runner.register_handler("generate", _generate_handler, resumable=_resumes_from_checkpoint)
+    runner.register_handler("generate_excel", _generate_excel_handler, resumable=_resumes_from_checkpoint)
+    runner.register_handler("convert", _convert_handler)
+    runner.register_handler("batch", _batch_handler)
+    runner.register_handler("audit", _audit_handler)
+    runner.register_handler("build_index", _build_index_handler)
+
+
+def default_max_workers():
+    """Reads the concurrency limit from JOB_MAX_WORKERS (default 2)."""
+    try:
+        return max(1, int(os.environ.get("JOB_MAX_WORKERS", "2")))
+    except ValueError:
+        return 2
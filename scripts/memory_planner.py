@@ -0,0 +1,114 @@
+# scripts/memory_planner.py
+import os
+from collections import namedtuple
+
+from .compression import split_compression_suffix, data_extension
+
+IN_MEMORY = "in_memory"
+STREAMING = "streaming"
+REJECT = "reject"
+
+ExecutionPlan = namedtuple("ExecutionPlan", ["mode", "estimated_bytes", "budget_bytes", "reason"])
+
+# Số byte RAM pandas dùng cho mỗi byte dữ liệu trên đĩa (ước lượng thận trọng).
+# XLSX là XML nén zip nên nở ra rất nhiều khi openpyxl + pandas đọc toàn bộ.
+MEMORY_EXPANSION_FACTORS = {
+    ".csv": 6,
+    ".txt": 6,
+    ".xlsx": 60,
+    ".xls": 60,
+}
+# File .gz/.zst chứa khoảng 4 lần dữ liệu so với kích thước trên đĩa
+COMPRESSED_SIZE_FACTOR = 4
+# Bộ nhớ làm việc khi xử lý theo luồng (một chunk DEFAULT_CHUNK_ROWS hàng + bộ đệm đọc/ghi)
+STREAMING_WORKING_SET_BYTES = 128 * 1024 * 1024
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# Định dạng mà xử lý theo luồng cho ra đúng file như khi đọc toàn bộ, theo từng thao tác.
+# CSV, TXT và Excel được đọc hai lượt để suy kiểu cột trên toàn file như pandas; riêng chuyển
+# đổi TXT tự đoán dấu phân cách trên toàn bộ file, nên file TXT quá lớn bị từ chối khi chuyển đổi.
+EXACT_STREAMING_EXTENSIONS = {
+    "count": (".csv", ".xlsx", ".xls"),
+    "split": (".csv", ".txt", ".xlsx", ".xls"),
+    "convert": (".csv", ".xlsx", ".xls"),
+}
+
+
+def available_memory_bytes():
+    """RAM currently available to new allocations, or None if it cannot be determined."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def memory_budget_bytes():
+    """
+    Per-job memory budget: MEMORY_BUDGET_MB (default 1024 MB), never more than the RAM
+    currently available on the server.
+    """
+    try:
+        budget = int(os.environ.get("MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB)) * 1024 * 1024
+    except ValueError:
+        budget = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024
+    available = available_memory_bytes()
+    if available is not None:
+        budget = min(budget, available)
+    return budget
+
+
+def estimate_memory_bytes(file_size, filename):
+    """Estimated peak RAM to load the whole file into a DataFrame."""
+    factor = MEMORY_EXPANSION_FACTORS.get(data_extension(filename), MEMORY_EXPANSION_FACTORS[".csv"])
+    if split_compression_suffix(filename)[1]:
+        factor *= COMPRESSED_SIZE_FACTOR
+    return int(file_size * factor)
+
+
+def stream_size(binary_stream):
+    """Size in bytes of a seekable stream, keeping its current position."""
+    position = binary_stream.tell()
+    binary_stream.seek(0, os.SEEK_END)
+    size = binary_stream.tell()
+    binary_stream.seek(position)
+    return size
+
+
+def streaming_supported_for(filename, operation, filtered=False):
+    """
+    Whether 'operation' ('count' / 'split' / 'convert') on 'filename' may fall back to
+    streaming without changing its output. Runs with row filters or a column selection
+    always stream, so they are always supported.
+    """
+    return filtered or data_extension(filename) in EXACT_STREAMING_EXTENSIONS[operation]
+
+
+def plan_execution(file_size, filename, streaming_supported=True, budget_bytes=None):
+    """
+    Chooses how to read a file of 'file_size' bytes:
+
+    - IN_MEMORY when the estimated DataFrame fits in the budget (fast path, existing code),
+    - STREAMING when it does not but the operation can run chunk by chunk,
+    - REJECT when neither fits, so the job fails cleanly instead of OOM-killing the server.
+    """
+    budget = memory_budget_bytes() if budget_bytes is None else budget_bytes
+    estimated = estimate_memory_bytes(file_size, filename)
+    size_mb = file_size / 1024 / 1024
+
+    if estimated <= budget:
+        return ExecutionPlan(IN_MEMORY, estimated, budget, "")
+    if streaming_supported and STREAMING_WORKING_SET_BYTES <= budget:
+        return ExecutionPlan(STREAMING, STREAMING_WORKING_SET_BYTES, budget,
+                             f"File '{filename}' ({size_mb:.1f} MB) cần khoảng {estimated / 1024 / 1024:.0f} MB RAM nếu đọc toàn bộ, "
+                             f"vượt giới hạn {budget / 1024 / 1024:.0f} MB: xử lý theo luồng.")
+    return ExecutionPlan(REJECT, estimated, budget,
+                         f"File '{filename}' ({size_mb:.1f} MB) cần khoảng {estimated / 1024 / 1024:.0f} MB RAM, "
+                         f"vượt giới hạn {budget / 1024 / 1024:.0f} MB cho mỗi tác vụ. Vui lòng chia nhỏ file hoặc tăng MEMORY_BUDGET_MB.")
@@ -0,0 +1,132 @@
+# scripts/row_filter.py
+import re
+
+import pandas as pd
+
+ROW_FILTER_OPERATORS = ("==", "!=", ">=", "<=", ">", "<", "contains", "startswith", "endswith", "in")
+
+_SYMBOL_FILTER = re.compile(r"^\s*(.+?)\s*(==|!=|>=|<=|>|<|=)\s*(.*?)\s*$")
+_WORD_FILTER = re.compile(r"^\s*(.+?)\s+(contains|startswith|endswith|in)\s+(.*?)\s*$", re.IGNORECASE)
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def parse_row_filters(filter_text):
+    """
+    Parses simple row filters, one per line (or separated by ';'), all of which must match:
+
+        region == North          status != cancelled
+        amount >= 100            code startswith ABC
+        name contains shop       campaign in A1, B2, C3
+
+    Column names can be header names, or 0-based column numbers for TXT files without a header.
+
+    Returns:
+        list of dicts {'column', 'op', 'value'} (JSON serializable, so they can be passed to background jobs).
+    """
+    row_filters = []
+    for raw in re.split(r"[;\n]", filter_text or ""):
+        if not raw.strip():
+            continue
+        # Nếu cả hai kiểu đều khớp (vd. 'note == in stock'), toán tử xuất hiện trước được chọn
+        matches = [m for m in (_WORD_FILTER.match(raw), _SYMBOL_FILTER.match(raw)) if m]
+        match = min(matches, key=lambda m: m.start(2)) if matches else None
+        if not match:
+            raise ValueError(f"Điều kiện lọc không hợp lệ: '{raw.strip()}'. Ví dụ: 'region == North' hoặc 'code startswith ABC'.")
+        column, op, value = match.group(1).strip(), match.group(2).lower(), match.group(3)
+        if op == "=":
+            op = "=="
+        if op == "in":
+            value = [_unquote(v.strip()) for v in value.split(",") if v.strip()]
+        else:
+            value = _unquote(value)
+        row_filters.append({"column": _unquote(column), "op": op, "value": value})
+    return row_filters
+
+
+def parse_column_selection(columns_text):
+    """Parses a comma-separated list of columns to keep ('' means all columns)."""
+    return [_unquote(c.strip()) for c in (columns_text or "").split(",") if c.strip()]
+
+
+def resolve_column(df, column):
+    """Finds a column by name, or by 0-based number for header-less (TXT) data."""
+    if column in df.columns:
+        return column
+    if str(column).isdigit() and int(column) in df.columns:
+        return int(column)
+    raise ValueError(f"Không tìm thấy cột '{column}'. Các cột hiện có: {', '.join(str(c) for c in df.columns)}.")
+
+
+def filter_columns_needed(row_filters, columns):
+    """Columns that must be read to evaluate the filters and produce the selection (None = all)."""
+    if not columns:
+        return None
+    needed = list(columns)
+    for row_filter in row_filters or []:
+        if row_filter["column"] not in needed:
+            needed.append(row_filter["column"])
+    return needed
+
+
+def _to_number(value, row_filter):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Giá trị '{value}' trong điều kiện lọc cột '{row_filter['column']}' phải là số khi dùng '{row_filter['op']}'.")
+
+
+def apply_row_filters(df, row_filters):
+    """Returns the rows of 'df' matching every filter."""
+    if not row_filters or df.empty:
+        return df
+
+    mask = pd.Series(True, index=df.index)
+    for row_filter in row_filters:
+        values = df[resolve_column(df, row_filter["column"])]
+        text_values = values.astype(str)
+        op, value = row_filter["op"], row_filter["value"]
+
+        if op in (">", ">=", "<", "<="):
+            numeric_values = pd.to_numeric(values, errors="coerce")
+            target = _to_number(value, row_filter)
+            condition = {
+                ">": numeric_values > target,
+                ">=": numeric_values >= target,
+                "<": numeric_values < target,
+                "<=": numeric_values <= target,
+            }[op]
+        elif op in ("==", "!="):
+            condition = text_values == value
+            # '5' cũng phải khớp với ô số 5.0 đọc từ Excel
+            try:
+                condition = condition | (pd.to_numeric(values, errors="coerce") == float(value))
+            except ValueError:
+                pass
+            if op == "!=":
+                condition = ~condition
+        elif op == "contains":
+            condition = text_values.str.contains(value, regex=False)
+        elif op == "startswith":
+            condition = text_values.str.startswith(value)
+        elif op == "endswith":
+            condition = text_values.str.endswith(value)
+        elif op == "in":
+            condition = text_values.isin(value)
+        else:
+            raise ValueError(f"Toán tử lọc '{op}' không được hỗ trợ. Hỗ trợ: {', '.join(ROW_FILTER_OPERATORS)}.")
+
+        mask &= condition.fillna(False)
+
+    return df[mask]
+
+
+def select_columns(df, columns):
+    """Keeps only the requested columns, in the requested order."""
+    if not columns:
+        return df
+    return df[[resolve_column(df, column) for column in columns]]
@@ -0,0 +1,400 @@
+# scripts/streaming_io.py
+import datetime
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.styles import Alignment, Border, Font, Side
+from pandas.io.parsers import TextParser
+
+from .compression import open_text, open_input_stream, data_extension
+from .row_filter import apply_row_filters, select_columns, filter_columns_needed
+
+# Số hàng mỗi chunk khi đọc/ghi theo luồng
+DEFAULT_CHUNK_ROWS = 100_000
+# Cột chứa nguyên văn mỗi dòng của file TXT (giống cách đọc dự phòng một cột 'Content')
+TXT_LINE_COLUMN = "Content"
+
+# Kiểu tiêu đề pandas dùng cho to_excel, để file ghi theo luồng giống file ghi một lần
+_HEADER_FONT = Font(bold=True)
+_HEADER_BORDER = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
+_HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+# Định dạng ngày giờ mặc định của to_excel
+_DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+_DATE_FORMAT = "YYYY-MM-DD"
+
+
+def _combined_dtype(dtypes, has_nulls, excel=False):
+    """
+    dtype pandas infers for a column over the whole file, given the dtypes it inferred
+    in the chunks where the column has values and whether any cell is empty.
+
+    pd.read_excel treats True/False cells as numbers (True + 1 -> int64, True + empty
+    -> float64) and keeps mixed columns as object with the original cell values;
+    pd.read_csv keeps mixed columns as text.
+    """
+    kinds = {dtype.kind for dtype in dtypes}
+    if not kinds:
+        # Cột hoàn toàn trống
+        return "float64"
+    if kinds == {"M"} and len(dtypes) == 1 and excel:
+        return next(iter(dtypes))
+    if kinds == {"b"}:
+        if not has_nulls:
+            return bool
+        # True/False có ô trống: read_excel đổi sang số thực, read_csv giữ kiểu object (True, False, NaN)
+        return "float64" if excel else "boolean"
+    if kinds <= set("iufb" if excel else "iuf"):
+        # vd. số nguyên ở một chunk, có ô trống (NaN) hoặc số thực ở chunk khác
+        if has_nulls or not kinds <= set("ib"):
+            return "float64"
+        return next(iter(dtypes)) if len(dtypes) == 1 else "int64"
+    return object if excel else str
+
+
+def _column_dtypes(chunks, excel=False):
+    """First pass over chunked reads: the whole-file dtype of every column (see _combined_dtype)."""
+    seen = {}
+    has_nulls = set()
+    chunks_with_rows = 0
+    columns_seen = {}
+    for chunk in chunks:
+        if len(chunk):
+            chunks_with_rows += 1
+            for column in chunk.columns:
+                columns_seen[column] = columns_seen.get(column, 0) + 1
+        for column in chunk.columns:
+            values = chunk[column]
+            dtypes = seen.setdefault(column, set())
+            non_null = values.dropna()
+            if len(non_null) < len(values):
+                has_nulls.add(column)
+            if non_null.empty:
+                continue
+            if values.dtype == object and all(isinstance(value, bool) for value in non_null):
+                dtypes.add(pd.api.types.pandas_dtype(bool))
+            else:
+                dtypes.add(values.dtype)
+    # Cột không có trong một chunk (các dòng ngắn hơn) sẽ là ô trống khi đọc cả file
+    has_nulls.update(column for column, count in columns_seen.items() if count < chunks_with_rows)
+    # Cột chưa từng có dòng nào (file chỉ có tiêu đề) giữ kiểu mặc định của pandas
+    return {column: _combined_dtype(dtypes, column in has_nulls, excel) for column, dtypes in seen.items()
+            if column in columns_seen}
+
+
+def _read_csv_typed(binary_stream, filename, chunksize, usecols=None, **read_options):
+    """
+    Reads a CSV-like input twice: once to infer column types over the whole file,
+    then chunk by chunk with those types, so every chunk has the values pd.read_csv
+    gives when loading the file at once (e.g. '007' -> 7 in a numeric column,
+    integers become floats if any cell in the column is empty).
+    """
+    dtypes = _column_dtypes(pd.read_csv(open_input_stream(binary_stream, filename), chunksize=chunksize,
+                                        usecols=usecols, **read_options))
+    yield from pd.read_csv(open_input_stream(binary_stream, filename), chunksize=chunksize, usecols=usecols,
+                           dtype=dtypes, **read_options)
+
+
+def _txt_field_count(binary_stream, filename):
+    """Largest number of tab-separated fields on a line of a TXT input."""
+    # Như read_csv, chỉ dòng hoàn toàn rỗng bị bỏ qua (dòng chỉ có tab vẫn là dữ liệu)
+    return max((line.count(b"\t") + 1 for line in open_input_stream(binary_stream, filename) if line.rstrip(b"\r\n")),
+               default=1)
+
+
+def _txt_chunk(lines, txt_fields):
+    df = pd.DataFrame({TXT_LINE_COLUMN: lines})
+    if txt_fields:
+        split_lines = [line.split("\t") for line in lines]
+        for field in txt_fields:
+            df[field] = [parts[field] if field < len(parts) else "" for parts in split_lines]
+    return df
+
+
+def iter_dataframe_chunks(binary_stream, filename, file_extension=None, chunksize=DEFAULT_CHUNK_ROWS, usecols=None,
+                          txt_lines=False, txt_fields=None):
+    """
+    Reads a (possibly gzip/zstd compressed) CSV / TXT / Excel input as a sequence of
+    DataFrames of at most 'chunksize' rows, so the whole file is never held in memory.
+
+    - CSV is read twice: once to infer column types over the whole file, then chunk
+      by chunk with those types, so values are the same as when the file is loaded
+      at once.
+    - TXT is read like pd.read_csv(sep='\t', header=None) on the whole file: columns
+      0, 1, ... with the same types, and lines with fewer fields padded with empty
+      cells. With 'txt_lines', it is read line by line like split_file_by_rows
+      instead: stripped, non-empty lines in a single 'Content' column, plus the
+      0-based fields listed in 'txt_fields' as text columns (missing fields are empty).
+    - Excel is read with openpyxl in read-only mode, first sheet, first row as header,
+      keeping the cell values; trailing empty rows are dropped like pd.read_excel.
+
+    'binary_stream' must be seekable (it is read more than once); 'file_extension'
+    defaults to the extension of 'filename'.
+    """
+    file_extension = file_extension or data_extension(filename)
+    if file_extension == '.csv':
+        yield from _read_csv_typed(binary_stream, filename, chunksize, usecols)
+    elif file_extension == '.txt' and not txt_lines:
+        field_count = _txt_field_count(binary_stream, filename)
+        yield from _read_csv_typed(binary_stream, filename, chunksize, sep='\t', header=None,
+                                   names=list(range(field_count)))
+    elif file_extension == '.txt':
+        lines = []
+        yielded = False
+        for raw_line in open_input_stream(binary_stream, filename):
+            line = raw_line.decode('utf-8').strip()
+            if not line:
+                continue
+            lines.append(line)
+            if len(lines) >= chunksize:
+                yield _txt_chunk(lines, txt_fields)
+                yielded = True
+                lines = []
+        if lines or not yielded:
+            yield _txt_chunk(lines, txt_fields)
+    elif file_extension in ['.xlsx', '.xls']:
+        yield from _read_excel_typed(binary_stream, filename, chunksize, usecols)
+    else:
+        raise ValueError(f"Định dạng file '{file_extension}' không được hỗ trợ.")
+
+
+def _excel_cell_value(cell):
+    # Giống OpenpyxlReader._convert_cell của pandas, để kiểu dữ liệu giống pd.read_excel
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return float("nan")
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _iter_excel_rows(binary_stream, filename):
+    """
+    Rows of the first sheet as pd.read_excel sees them: cell values converted like
+    pandas, trailing empty cells removed and trailing empty rows dropped.
+    """
+    workbook = openpyxl.load_workbook(open_input_stream(binary_stream, filename), read_only=True, data_only=True,
+                                      keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        sheet.reset_dimensions()
+        blank_rows = 0
+        for cells in sheet.rows:
+            row = [_excel_cell_value(cell) for cell in cells]
+            while row and row[-1] == "":
+                row.pop()
+            if not row:
+                # Chỉ giữ các dòng trống nằm giữa dữ liệu, bỏ các dòng trống ở cuối sheet
+                blank_rows += 1
+                continue
+            for _ in range(blank_rows):
+                yield []
+            blank_rows = 0
+            yield row
+    finally:
+        workbook.close()
+
+
+def _iter_row_batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _excel_frame(header, rows, width, dtype=None):
+    # Như pd.read_excel: các dòng được kéo dài tới độ rộng của sheet rồi đọc bằng TextParser
+    data = [row + [""] * (width - len(row)) for row in [header] + rows]
+    return TextParser(data, header=0, skip_blank_lines=False, dtype=dtype).read()
+
+
+def _read_excel_typed(binary_stream, filename, chunksize, usecols=None):
+    """
+    Reads the first sheet of an Excel file twice with openpyxl in read-only mode:
+    once to find the sheet width and infer column types over the whole sheet, then
+    chunk by chunk with those types, so every chunk has the columns and values
+    pd.read_excel gives when loading the file at once.
+    """
+    rows = _iter_excel_rows(binary_stream, filename)
+    header = next(rows, None)
+    if header is None:
+        return
+    width = len(header)
+
+    def frames_for_types():
+        nonlocal width
+        for batch in _iter_row_batches(rows, chunksize):
+            batch_width = max(1, len(header), max(len(row) for row in batch))
+            width = max(width, batch_width)
+            yield _excel_frame(header, batch, batch_width)
+
+    dtypes = _column_dtypes(frames_for_types(), excel=True)
+    object_columns = {column: object for column, dtype in dtypes.items() if dtype is object}
+
+    rows = _iter_excel_rows(binary_stream, filename)
+    next(rows)
+    yielded = False
+    for batch in _iter_row_batches(rows, chunksize):
+        yield _select_excel_columns(_cast_columns(_excel_frame(header, batch, width, object_columns), dtypes), usecols)
+        yielded = True
+    if not yielded:
+        # File chỉ có tiêu đề vẫn trả về một chunk rỗng để đầu ra có tiêu đề
+        yield _select_excel_columns(_excel_frame(header, [], width), usecols)
+
+
+def _cast_columns(df, dtypes):
+    for column, dtype in dtypes.items():
+        if dtype is not object and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def _select_excel_columns(df, usecols):
+    if usecols:
+        df = df[[c for c in usecols if c in df.columns]]
+    return df
+
+
+def _excel_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    # Giá trị numpy (int64, bool_, ...) -> kiểu Python để openpyxl ghi đúng ô số / ô logic
+    return value.item() if hasattr(value, "item") else value
+
+
+class ChunkWriter:
+    """
+    Appends DataFrame chunks to one CSV / TXT / XLSX output file, producing the same
+    file as writing the whole DataFrame at once with the existing converters.
+
+    CSV gets a header once, TXT is tab-separated without header, XLSX is written with
+    an openpyxl write-only workbook ('Sheet1', header and date formats like
+    to_excel). With 'raw_lines', TXT output writes the first column verbatim, one
+    line per row and no trailing newline, like split_file_by_rows does for TXT files.
+    CSV/TXT are compressed if the path ends in '.gz' / '.zst'.
+    """
+
+    def __init__(self, output_path, output_format, raw_lines=False):
+        if output_format not in ('csv', 'txt', 'xlsx'):
+            raise ValueError(f"Định dạng đầu ra '{output_format}' không được hỗ trợ.")
+        self.output_path = output_path
+        self.output_format = output_format
+        self.raw_lines = raw_lines and output_format == 'txt'
+        self.rows_written = 0
+        self._header_written = False
+        self._file = None
+        self._workbook = None
+        self._sheet = None
+        if output_format == 'xlsx':
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet("Sheet1")
+        else:
+            self._file = open_text(output_path, 'w')
+
+    def _header_cell(self, column):
+        # Như to_excel: tên cột số (vd. cột 0, 1, ... của file TXT) được ghi dưới dạng số
+        cell = WriteOnlyCell(self._sheet, value=_excel_value(column))
+        cell.font = _HEADER_FONT
+        cell.border = _HEADER_BORDER
+        cell.alignment = _HEADER_ALIGNMENT
+        return cell
+
+    def _data_cell(self, value):
+        value = _excel_value(value)
+        if not isinstance(value, datetime.date):
+            return value
+        cell = WriteOnlyCell(self._sheet, value=value)
+        cell.number_format = _DATETIME_FORMAT if isinstance(value, datetime.datetime) else _DATE_FORMAT
+        return cell
+
+    def write(self, df):
+        if self.output_format == 'xlsx':
+            if not self._header_written:
+                self._sheet.append([self._header_cell(c) for c in df.columns])
+            for row in df.itertuples(index=False, name=None):
+                self._sheet.append([self._data_cell(value) for value in row])
+        elif self.output_format == 'csv':
+            df.to_csv(self._file, index=False, header=not self._header_written)
+        elif self.raw_lines:
+            for line in df.iloc[:, 0]:
+                self._file.write(line if self.rows_written == 0 else "\n" + line)
+                self.rows_written += 1
+            self._header_written = True
+            return
+        else:
+            df.to_csv(self._file, sep='\t', index=False, header=False)
+        self._header_written = True
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.save(self.output_path)
+            self._workbook = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def txt_fields_needed(row_filters, columns):
+    """0-based TXT field numbers referenced by the filters or the column selection."""
+    fields = []
+    for column in [f["column"] for f in row_filters or []] + list(columns or []):
+        if str(column).isdigit() and int(column) not in fields:
+            fields.append(int(column))
+    return fields
+
+
+def iter_filtered_chunks(binary_stream, filename, file_extension=None, row_filters=None, columns=None,
+                         chunksize=DEFAULT_CHUNK_ROWS, raw_lines=False):
+    """
+    Streams the input and yields only matching rows and selected columns of each chunk.
+    When columns are selected, a CSV reader only parses the columns needed for the
+    selection and the filters. With 'raw_lines' (TXT written back to TXT without a
+    column selection), TXT chunks keep the original lines in a single 'Content'
+    column and only the fields the filters reference are split out; otherwise TXT is
+    split into columns 0, 1, ... like an unfiltered conversion.
+    """
+    file_extension = file_extension or data_extension(filename)
+    raw_lines = raw_lines and file_extension == '.txt' and not columns
+    usecols = filter_columns_needed(row_filters, columns) if file_extension == '.csv' else None
+    txt_fields = txt_fields_needed(row_filters, columns) if raw_lines else None
+    for chunk in iter_dataframe_chunks(binary_stream, filename, file_extension, chunksize, usecols=usecols,
+                                       txt_lines=raw_lines, txt_fields=txt_fields):
+        chunk = apply_row_filters(chunk, row_filters)
+        if raw_lines:
+            chunk = chunk[[TXT_LINE_COLUMN]]
+        yield select_columns(chunk, columns)
+
+
+def convert_streaming(binary_stream, filename, output_path, output_format, file_extension=None, row_filters=None,
+                      columns=None, chunksize=DEFAULT_CHUNK_ROWS, preview_rows=5):
+    """
+    Converts a file chunk by chunk, applying row filters and column selection while
+    reading, so only matching rows are ever materialized and written.
+
+    Returns:
+        tuple: (rows written, DataFrame with the first 'preview_rows' written rows).
+    """
+    file_extension = file_extension or data_extension(filename)
+    preview = None
+    raw_lines = file_extension == '.txt' and output_format == 'txt' and not columns
+    with ChunkWriter(output_path, output_format, raw_lines=raw_lines) as writer:
+        for chunk in iter_filtered_chunks(binary_stream, filename, file_extension, row_filters, columns, chunksize,
+                                          raw_lines):
+            writer.write(chunk)
+            if preview is None or len(preview) < preview_rows:
+                preview = chunk.head(preview_rows) if preview is None else pd.concat([preview, chunk]).head(preview_rows)
+    return writer.rows_written, preview if preview is not None else pd.DataFrame()
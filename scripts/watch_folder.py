@@ -0,0 +1,239 @@
+# scripts/watch_folder.py
+import argparse
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from .batch_processor import DEFAULT_MAX_OPEN_PARTITIONS
+from .compression import data_extension
+from .job_runner import JobRunner, JOB_DONE, JOB_FAILED, default_max_workers
+
+WATCH_TASKS = ("convert", "batch", "generate_excel")
+
+# Phần mở rộng của file đang được chép vào thư mục (bỏ qua cho tới khi đổi tên xong)
+_IN_PROGRESS_SUFFIXES = (".tmp", ".part", ".crdownload", ".partial")
+_JOB_SIDECAR_SUFFIX = ".job"
+
+
+class FolderWatcher:
+    """
+    Picks up files dropped into 'watch_dir' and runs them through the existing
+    convert / batch (split + convert) / Excel code generation logic as background jobs,
+    without any browser upload or in-memory copy.
+
+    Layout inside 'watch_dir':
+        <file>            new files (the inbox)
+        processing/       files whose job is queued or running
+        done/             finished inputs, with their outputs in '<file>_output/'
+        failed/           inputs whose job failed, with '<file>.error.txt'
+
+    A file is only picked up once its size has stopped changing between two scans.
+    At most 'max_in_flight' files are in processing/ at a time; the job runner's own
+    worker limit bounds how many of them actually run concurrently. Job ids are kept
+    next to processing files, so a restarted watcher keeps tracking unfinished jobs.
+    """
+
+    def __init__(self, watch_dir, job_runner, task, task_params=None, max_in_flight=4, poll_interval=5.0):
+        if task not in WATCH_TASKS:
+            raise ValueError(f"Tác vụ '{task}' không được hỗ trợ cho thư mục theo dõi. Chọn một trong: {', '.join(WATCH_TASKS)}.")
+        self.watch_dir = Path(watch_dir)
+        self.job_runner = job_runner
+        self.task = task
+        self.task_params = task_params or {}
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+
+        self.processing_dir = self.watch_dir / "processing"
+        self.done_dir = self.watch_dir / "done"
+        self.failed_dir = self.watch_dir / "failed"
+        for directory in (self.watch_dir, self.processing_dir, self.done_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self._seen_sizes = {}
+        self._in_flight = self._load_in_flight()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _load_in_flight(self):
+        in_flight = {}
+        for sidecar in self.processing_dir.glob(f"*{_JOB_SIDECAR_SUFFIX}"):
+            input_path = sidecar.with_suffix("")
+            if input_path.exists():
+                in_flight[input_path] = sidecar.read_text(encoding="utf-8").strip()
+            else:
+                sidecar.unlink()
+        return in_flight
+
+    def _accepts(self, path):
+        if not path.is_file() or path.name.startswith(".") or path.name.lower().endswith(_IN_PROGRESS_SUFFIXES):
+            return False
+        extension = data_extension(path.name)
+        if self.task == "generate_excel":
+            return extension in (".xlsx", ".xls")
+        return extension in (".csv", ".txt", ".xlsx", ".xls")
+
+    def _ready_files(self):
+        """Files in the inbox whose size did not change since the previous scan."""
+        ready = []
+        current_sizes = {}
+        for path in sorted(self.watch_dir.iterdir()):
+            if not self._accepts(path):
+                continue
+            size = path.stat().st_size
+            current_sizes[path.name] = size
+            if self._seen_sizes.get(path.name) == size:
+                ready.append(path)
+        self._seen_sizes = current_sizes
+        return ready
+
+    def _job_params(self, input_path):
+        if self.task == "convert":
+            return {"input_file": str(input_path), **self.task_params}
+        if self.task == "batch":
+            split_config = self.task_params.get("split_config", {})
+            return {
+                "input_files": [str(input_path)],
+                "output_format": self.task_params.get("output_format", "csv"),
+                "compression": self.task_params.get("compression"),
+                "row_filters": self.task_params.get("row_filters"),
+                "columns": self.task_params.get("columns"),
+                "split_configs": {input_path.name: split_config} if split_config else {},
+            }
+        return {"input_file": str(input_path), **self.task_params}
+
+    @staticmethod
+    def _unique_name(directory, name):
+        """'name', or '<time>_name' / '<time>_<n>_name' if a file of that name is already in 'directory'."""
+        if not (directory / name).exists():
+            return name
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        unique_name = f"{timestamp}_{name}"
+        counter = 1
+        while (directory / unique_name).exists():
+            counter += 1
+            unique_name = f"{timestamp}_{counter}_{name}"
+        return unique_name
+
+    def _submit(self, path):
+        # Một file cùng tên có thể vẫn đang chờ/chạy: không ghi đè file đó
+        processing_path = self.processing_dir / self._unique_name(self.processing_dir, path.name)
+        os.replace(path, processing_path)
+        job_id = self.job_runner.submit(self.task, self._job_params(processing_path))
+        Path(str(processing_path) + _JOB_SIDECAR_SUFFIX).write_text(job_id, encoding="utf-8")
+        self._in_flight[processing_path] = job_id
+        print(f"Thư mục theo dõi: đã nhận '{path.name}' (tác vụ {job_id}).")
+
+    def _finish(self, processing_path, job):
+        target_dir = self.done_dir if job["status"] == JOB_DONE else self.failed_dir
+        # Cùng tên file đã được xử lý trước đó: thêm thời điểm để không ghi đè
+        target_name = self._unique_name(target_dir, processing_path.name)
+        os.replace(processing_path, target_dir / target_name)
+        Path(str(processing_path) + _JOB_SIDECAR_SUFFIX).unlink(missing_ok=True)
+
+        if job["status"] == JOB_DONE:
+            output_dir = target_dir / f"{target_name}_output"
+            output_dir.mkdir(exist_ok=True)
+            for output_file in (job["result"] or {}).get("output_files", []):
+                if Path(output_file).exists():
+                    shutil.move(output_file, output_dir / Path(output_file).name)
+        else:
+            (target_dir / f"{target_name}.error.txt").write_text(job["error"] or "", encoding="utf-8")
+        print(f"Thư mục theo dõi: '{processing_path.name}' -> {target_dir.name}/.")
+
+    def poll_once(self):
+        """Checks running jobs, then moves newly arrived files into processing."""
+        for processing_path, job_id in list(self._in_flight.items()):
+            job = self.job_runner.get_job(job_id)
+            if job is None:
+                job = {"status": JOB_FAILED, "error": f"Không tìm thấy tác vụ '{job_id}'.", "result": None}
+            if job["status"] in (JOB_DONE, JOB_FAILED):
+                try:
+                    self._finish(processing_path, job)
+                except Exception as e:
+                    print(f"Lỗi khi hoàn tất file '{processing_path.name}': {e}")
+                del self._in_flight[processing_path]
+
+        for path in self._ready_files():
+            if len(self._in_flight) >= self.max_in_flight:
+                break
+            try:
+                self._submit(path)
+            except Exception as e:
+                print(f"Lỗi khi nhận file '{path.name}' từ thư mục theo dõi: {e}")
+
+    def status(self):
+        """Number of files in each stage, for display."""
+        return {
+            "inbox": sum(1 for p in self.watch_dir.iterdir() if self._accepts(p)),
+            "processing": len(self._in_flight),
+            "done": sum(1 for p in self.done_dir.iterdir() if p.is_file()),
+            "failed": sum(1 for p in self.failed_dir.iterdir() if p.is_file() and not p.name.endswith(".error.txt")),
+        }
+
+    def run_forever(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Lỗi trong vòng lặp thư mục theo dõi '{self.watch_dir}': {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run_forever, name=f"watch-{self.watch_dir.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tự động xử lý các file được thả vào một thư mục trên máy chủ.")
+    parser.add_argument("watch_dir", help="Thư mục cần theo dõi.")
+    parser.add_argument("--task", choices=WATCH_TASKS, default="convert")
+    parser.add_argument("--target-format", choices=["csv", "excel", "txt"], default="csv", help="Cho tác vụ convert.")
+    parser.add_argument("--output-format", choices=["csv", "xlsx", "txt"], default="csv", help="Cho tác vụ batch.")
+    parser.add_argument("--lines-to-keep", type=int, default=None, help="Tác vụ batch: tách file sau số dòng này.")
+    parser.add_argument("--suffix", default="(1)", help="Tác vụ batch: hậu tố cho phần tách mới.")
+    parser.add_argument("--partition-column", default=None, help="Tác vụ batch: tách mỗi giá trị của cột này thành một file.")
+    parser.add_argument("--max-open-files", type=int, default=DEFAULT_MAX_OPEN_PARTITIONS, help="Tác vụ batch: số file phân vùng mở cùng lúc tối đa.")
+    parser.add_argument("--directory-to-check", default=os.getcwd(), help="Tác vụ generate_excel: thư mục mã hiện có.")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None)
+    parser.add_argument("--workers", type=int, default=default_max_workers())
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.task == "convert":
+        task_params = {"target_format": args.target_format, "compression": args.compression}
+    elif args.task == "batch":
+        task_params = {"output_format": args.output_format, "compression": args.compression}
+        if args.partition_column:
+            task_params["split_config"] = {"do_split": True, "split_by": "column", "partition_column": args.partition_column,
+                                           "max_open_files": args.max_open_files}
+        elif args.lines_to_keep:
+            task_params["split_config"] = {"do_split": True, "lines_to_keep": args.lines_to_keep, "suffix": args.suffix}
+    else:
+        task_params = {"directory_to_check": args.directory_to_check, "compression": args.compression}
+
+    job_runner = JobRunner(Path(args.watch_dir) / ".jobs", max_workers=args.workers)
+    watcher = FolderWatcher(args.watch_dir, job_runner, args.task, task_params,
+                            max_in_flight=args.max_in_flight, poll_interval=args.poll_interval)
+    print(f"Đang theo dõi '{args.watch_dir}' (tác vụ {args.task}). Nhấn Ctrl+C để dừng.")
+    try:
+        watcher.run_forever()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()